@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from indicators import IndicatorPipeline
+from market_analyzer import classify_changes
+from config import Config
+
+CLOSE_COLUMNS = ('close', 'Close', '4. close', 'adj_close', 'Adj Close')
+DATE_COLUMNS = ('date', 'Date', 'timestamp', 'time')
+
+def _read_frame(path):
+    if path.endswith('.parquet'):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path)
+
+    date_column = next((column for column in DATE_COLUMNS if column in frame.columns), None)
+    if date_column is not None:
+        frame = frame.set_index(date_column)
+    close_column = next((column for column in CLOSE_COLUMNS if column in frame.columns), None)
+    if close_column is None:
+        raise ValueError(f"No close column found in {path}")
+
+    closes = frame[close_column].astype(float)
+    closes.index = pd.to_datetime(closes.index)
+    return closes
+
+def load_closes_from_directory(directory, symbols=None):
+    # One CSV or Parquet file per symbol, named after the symbol (SPY.csv, VOO.parquet, ...)
+    series = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.csv')) + glob.glob(os.path.join(directory, '*.parquet'))):
+        symbol = os.path.splitext(os.path.basename(path))[0].upper()
+        if symbols and symbol not in symbols:
+            continue
+        series[symbol] = _read_frame(path)
+
+    if not series:
+        return None
+    return pd.DataFrame(series).sort_index()
+
+def load_closes_from_store(symbols=None):
+    from bar_store import BarStore
+
+    store = BarStore(getattr(Config, 'BAR_STORE_PATH', os.path.join('data', 'bars.db')))
+    rows = store.get_close_history(symbols)
+    if not rows:
+        return None
+
+    closes = pd.DataFrame(rows, columns=['symbol', 'date', 'close']).pivot(index='date', columns='symbol', values='close')
+    closes.index = pd.to_datetime(closes.index)
+    return closes.sort_index()
+
+# Same indicator definitions as the live analyzer
+FEATURE_PIPELINE = IndicatorPipeline(('change_percent', 'sma_20', 'volatility_percent'))
+
+def compute_features(closes, horizons):
+    # closes: dates x symbols, oldest -> newest
+    values = closes.to_numpy(dtype=float)
+    indicators = FEATURE_PIPELINE.run(close=values)
+    sma_20 = indicators['sma_20']
+    volatility_percent = indicators['volatility_percent']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        forward_returns = {}
+        for horizon in horizons:
+            future = np.vstack([values[horizon:], np.full((horizon, values.shape[1]), np.nan)])
+            forward_returns[horizon] = (future - values) / values * 100
+
+        return {
+            'change_percent': indicators['change_percent'],
+            'oversold': values < sma_20 * 0.95,
+            'overbought': values > sma_20 * 1.05,
+            'high_volatility': volatility_percent > 3,
+            'forward_returns': forward_returns
+        }
+
+def _signal_stats(prefix, mask, features, horizons, favourable):
+    stats = {f'{prefix}_signals': int(mask.sum())}
+    for horizon in horizons:
+        returns = features['forward_returns'][horizon]
+        selected = mask & ~np.isnan(returns)
+        count = selected.sum()
+        stats[f'{prefix}_fwd_{horizon}d'] = float(returns[selected].mean()) if count else np.nan
+        stats[f'{prefix}_hit_{horizon}d'] = float((favourable(returns[selected])).mean()) if count else np.nan
+    return stats
+
+def backtest(closes, buy_thresholds=None, sell_thresholds=None, horizons=(1, 5, 20)):
+    if buy_thresholds is None:
+        buy_thresholds = [Config.BUY_ALERT_THRESHOLD]
+    if sell_thresholds is None:
+        sell_thresholds = [Config.SELL_ALERT_THRESHOLD]
+
+    features = compute_features(closes, horizons)
+    change_percent = features['change_percent']
+    observed = ~np.isnan(change_percent)
+    symbol_years = observed.sum() / 252
+
+    # With buy_threshold < sell_threshold the BUY and SELL masks are disjoint, so their stats can be reused across the grid
+    buy_stats = {}
+    sell_stats = {}
+    results = []
+    for buy_threshold in buy_thresholds:
+        for sell_threshold in sell_thresholds:
+            if buy_threshold >= sell_threshold:
+                continue
+
+            # Same rules as MarketAnalyzer, applied to every symbol and day at once
+            buy, sell, strong = classify_changes(change_percent, buy_threshold, sell_threshold)
+            alerts = buy | sell
+
+            row = {
+                'buy_threshold': buy_threshold,
+                'sell_threshold': sell_threshold,
+                'alerts': int(alerts.sum()),
+                'alerts_per_symbol_year': float(alerts.sum() / symbol_years) if symbol_years else np.nan,
+                'high_confidence': int(strong.sum()),
+                'buy_oversold': int((buy & features['oversold']).sum()),
+                'sell_overbought': int((sell & features['overbought']).sum()),
+                'high_volatility': int((alerts & features['high_volatility']).sum())
+            }
+            if buy_threshold not in buy_stats:
+                buy_stats[buy_threshold] = _signal_stats('buy', buy, features, horizons, lambda returns: returns > 0)
+            if sell_threshold not in sell_stats:
+                sell_stats[sell_threshold] = _signal_stats('sell', sell, features, horizons, lambda returns: returns < 0)
+            row.update(buy_stats[buy_threshold])
+            row.update(sell_stats[sell_threshold])
+            results.append(row)
+
+    return pd.DataFrame(results)
+
+def _parse_floats(value):
+    return [float(item) for item in value.split(',') if item.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay historical daily bars through the MarketAnalyzer rules")
+    parser.add_argument('--data', help="Directory of per-symbol CSV/Parquet files (default: the local bar store)")
+    parser.add_argument('--symbols', help="Comma-separated symbols to include (default: all available)")
+    parser.add_argument('--buy', type=_parse_floats, help="Buy thresholds to sweep, e.g. -1,-2,-3")
+    parser.add_argument('--sell', type=_parse_floats, help="Sell thresholds to sweep, e.g. 2,3,4")
+    parser.add_argument('--horizons', default='1,5,20', help="Forward return horizons in trading days")
+    parser.add_argument('--output', help="Write the results to this CSV file")
+    args = parser.parse_args()
+
+    symbols = [symbol.strip().upper() for symbol in args.symbols.split(',')] if args.symbols else None
+    horizons = [int(horizon) for horizon in _parse_floats(args.horizons)]
+
+    start = time.perf_counter()
+    closes = load_closes_from_directory(args.data, symbols) if args.data else load_closes_from_store(symbols)
+    if closes is None or closes.empty:
+        print("No historical data found.")
+        sys.exit(1)
+    loaded = time.perf_counter()
+
+    results = backtest(closes, args.buy, args.sell, horizons)
+    finished = time.perf_counter()
+
+    print(f"Backtest over {closes.shape[1]} symbols, {closes.shape[0]} days "
+          f"({closes.index[0]:%Y-%m-%d} to {closes.index[-1]:%Y-%m-%d})")
+    print(f"Loaded data in {loaded - start:.2f}s, evaluated {len(results)} parameter sets in {finished - loaded:.2f}s\n")
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+class BarStore:
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bars (
+                    symbol TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    open REAL,
+                    high REAL,
+                    low REAL,
+                    close REAL,
+                    volume REAL,
+                    PRIMARY KEY (symbol, date)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    symbol TEXT PRIMARY KEY,
+                    synced_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def latest_date(self, symbol):
+        with self._connection() as conn:
+            row = conn.execute("SELECT MAX(date) FROM bars WHERE symbol = ?", (symbol,)).fetchone()
+        return datetime.strptime(row[0], '%Y-%m-%d') if row and row[0] else None
+
+    def last_synced(self, symbol):
+        with self._connection() as conn:
+            row = conn.execute("SELECT synced_at FROM sync_state WHERE symbol = ?", (symbol,)).fetchone()
+        return row[0] if row else None
+
+    def mark_synced(self, symbol, synced_at):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state (symbol, synced_at) VALUES (?, ?)", (symbol, synced_at))
+
+    def upsert(self, symbol, bars):
+        # bars are (date, open, high, low, close, volume) tuples
+        with self._connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)", [(symbol, *bar) for bar in bars])
+        return len(bars)
+
+    def get_bars(self, symbol, limit):
+        # The latest `limit` bars, oldest first like the data providers return them
+        with self._connection() as conn:
+            return conn.execute("""
+                SELECT date, open, high, low, close, volume FROM (
+                    SELECT date, open, high, low, close, volume FROM bars
+                    WHERE symbol = ? ORDER BY date DESC LIMIT ?
+                ) ORDER BY date
+            """, (symbol, limit)).fetchall()
+
+    def get_closes(self, symbols, limit):
+        # Last `limit` closes for each symbol as (symbol, date, close) rows
+        symbols = list(symbols)
+        if not symbols:
+            return []
+        placeholders = ','.join('?' * len(symbols))
+        with self._connection() as conn:
+            return conn.execute(f"""
+                SELECT symbol, date, close FROM (
+                    SELECT symbol, date, close,
+                           ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) AS age
+                    FROM bars WHERE symbol IN ({placeholders})
+                ) WHERE age <= ?
+            """, (*symbols, limit)).fetchall()
+
+    def get_close_history(self, symbols=None):
+        # Every stored close as (symbol, date, close) rows, optionally limited to some symbols
+        with self._connection() as conn:
+            if not symbols:
+                return conn.execute("SELECT symbol, date, close FROM bars").fetchall()
+            symbols = list(symbols)
+            placeholders = ','.join('?' * len(symbols))
+            return conn.execute(f"SELECT symbol, date, close FROM bars WHERE symbol IN ({placeholders})", symbols).fetchall()
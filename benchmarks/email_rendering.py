@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_notifier import EmailNotifier
+from market_analyzer import describe_change
+
+def make_analyses(count, seed=42):
+    rng = random.Random(seed)
+    analyses = {}
+    for i in range(count):
+        symbol = f"SYN{i:05d}"
+        change_percent = rng.gauss(0, 2.5)
+        signal = 'BUY' if change_percent <= -2 else 'SELL' if change_percent >= 3 else 'HOLD'
+        confidence = 'LOW' if signal == 'HOLD' else 'HIGH' if abs(change_percent) >= 4 else 'MEDIUM'
+        analyses[symbol] = {
+            'symbol': symbol,
+            'current_price': rng.uniform(5, 500),
+            'change_percent': change_percent,
+            'signal': signal,
+            'confidence': confidence,
+            'reasons': describe_change(signal, confidence, change_percent),
+            'technical_signals': ["Price significantly below 20-day average - Oversold <check>"]
+        }
+    return analyses
+
+def measure(label, func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<40} median {statistics.median(timings) * 1000:9.2f} ms   min {min(timings) * 1000:9.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time email body rendering")
+    parser.add_argument('--symbols', type=int, default=1000, help="Rows in the daily summary")
+    parser.add_argument('--alerts', type=int, default=5000, help="Alert bodies rendered per run")
+    parser.add_argument('--digest', type=int, default=50, help="Alerts per digest")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Rendering only: no SMTP connection is opened
+    notifier = EmailNotifier()
+    analyses = make_analyses(max(args.symbols, args.alerts))
+    summary = dict(list(analyses.items())[:args.symbols])
+    alerts = list(analyses.values())[:args.alerts]
+    digest = alerts[:args.digest]
+
+    measure(f"daily summary ({args.symbols} symbols)", lambda: notifier._create_summary_body(summary), args.repeat)
+    measure(f"alert bodies ({args.alerts} alerts)", lambda: [notifier._create_email_body(a) for a in alerts], args.repeat)
+    measure(f"digest ({args.digest} alerts)", lambda: notifier._create_digest_body(digest), args.repeat)
+
+    def digests_with_cache():
+        # 100 groups with overlapping digests, as produced by subscription fan-out
+        cache = {}
+        for offset in range(100):
+            notifier._create_digest_body(alerts[offset:offset + args.digest], cache)
+    measure(f"100 overlapping digests ({args.digest} alerts)", digests_with_cache, args.repeat)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
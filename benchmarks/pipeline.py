@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from smtp_sink import SMTPSink
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap(self, obj, attribute, stage):
+        # Replaces a bound method on one instance only; the class and other instances are untouched
+        original = getattr(obj, attribute)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+
+        setattr(obj, attribute, timed)
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+def summarize(samples):
+    ordered = sorted(samples)
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+    return {
+        'count': len(ordered),
+        'total_ms': sum(ordered) * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': percentile(50) * 1000,
+        'p90_ms': percentile(90) * 1000,
+        'p99_ms': percentile(99) * 1000,
+        'max_ms': ordered[-1] * 1000
+    }
+
+def configure(state_dir, symbols, smtp_port, args):
+    # Everything the pipeline persists goes to a throwaway directory; nothing touches data/ or the network
+    settings = {
+        'DATA_PROVIDER': 'synthetic',
+        'SYNTHETIC_SYMBOLS': symbols,
+        'SYNTHETIC_SEED': args.seed,
+        'SNAPSHOT_CACHE_SECONDS': 0,
+        'FETCH_WORKERS': args.workers,
+        'SMTP_SERVER': '127.0.0.1',
+        'SMTP_PORT': smtp_port,
+        'SMTP_USE_TLS': False,
+        'EMAIL_ADDRESS': 'benchmark@localhost',
+        'EMAIL_PASSWORD': 'unused',
+        'RECIPIENT_EMAIL': 'recipient@localhost',
+        'ALERT_COOLDOWN_MINUTES': 0,
+        'ALERT_DELIVERY_MODE': 'immediate',
+        'COOLDOWN_STORE_PATH': os.path.join(state_dir, 'cooldowns.db'),
+        'OUTBOX_PATH': os.path.join(state_dir, 'outbox.db'),
+        'SUBSCRIPTIONS_PATH': os.path.join(state_dir, 'subscriptions.db'),
+        'HISTORY_PATH': os.path.join(state_dir, 'history.db'),
+        'SYMBOL_UNIVERSE_PATH': os.path.join(state_dir, 'universe.db'),
+        'SCAN_CYCLE_PATH': os.path.join(state_dir, 'scan_cycles.db'),
+        'SYMBOL_UNIVERSE_FILE': None
+    }
+    if args.buy is not None:
+        settings['BUY_ALERT_THRESHOLD'] = args.buy
+    if args.sell is not None:
+        settings['SELL_ALERT_THRESHOLD'] = args.sell
+    for name, value in settings.items():
+        setattr(Config, name, value)
+
+def run_size(symbols, args, sink):
+    from main import StockAlertSystem
+
+    with tempfile.TemporaryDirectory(prefix='stockalert-bench-') as state_dir:
+        configure(state_dir, symbols, sink.port, args)
+        system = StockAlertSystem()
+        for i in range(args.subscribers):
+            system.notifier.subscriptions.add(f"subscriber{i}@localhost")
+
+        timer = StageTimer()
+        timer.wrap(system.data_provider, 'fetch_snapshots', 'fetch')
+        timer.wrap(system.analyzer, 'analyze_stock', 'analyze_stock')
+        timer.wrap(system.cooldowns, 'active', 'cooldown')
+        timer.wrap(system.cooldowns, 'try_acquire_many', 'cooldown')
+        timer.wrap(system.outbox, 'enqueue_many', 'enqueue')
+        timer.wrap(system.analyzer.indicators, 'latest', 'indicators')
+        timer.wrap(system.history, 'append', 'history')
+        timer.wrap(system.notifier, '_create_email_body', 'render')
+        timer.wrap(system.notifier.transport, 'send', 'smtp_send')
+
+        messages_before = sink.messages
+        peaks = []
+        with open(os.devnull, 'w') as devnull:
+            for cycle in range(args.warmup + args.cycles):
+                if args.memory:
+                    tracemalloc.start()
+                with contextlib.redirect_stdout(devnull):
+                    start = time.perf_counter()
+                    system.check_markets()
+                    checked = time.perf_counter()
+                    system.sender.drain_once()
+                    delivered = time.perf_counter()
+                if args.memory:
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+
+                if cycle < args.warmup:
+                    # First cycle fills the indicator cache and builds the subscription index
+                    timer.samples.clear()
+                    continue
+                timer.record('check_markets', checked - start)
+                timer.record('deliver', delivered - checked)
+                timer.record('cycle', delivered - start)
+
+        result = {
+            'symbols': symbols,
+            'cycles': args.cycles,
+            'messages_sent': sink.messages - messages_before,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'stages': {stage: summarize(samples) for stage, samples in timer.samples.items()}
+        }
+        if peaks:
+            result['traced_peak_mb'] = max(peaks) / 1024 / 1024
+        system.notifier.transport.close()
+        return result
+
+def print_result(result):
+    memory = f", traced peak {result['traced_peak_mb']:.1f} MB" if 'traced_peak_mb' in result else ''
+    print(f"\n{result['symbols']} symbols: {result['messages_sent']} emails, max RSS {result['max_rss_mb']:.1f} MB{memory}")
+    print(f"  {'stage':<15}{'count':>8}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'total ms':>12}")
+    for stage, stats in sorted(result['stages'].items(), key=lambda item: -item[1]['total_ms']):
+        print(f"  {stage:<15}{stats['count']:>8}{stats['p50_ms']:>11.3f}{stats['p90_ms']:>11.3f}"
+              f"{stats['p99_ms']:>11.3f}{stats['total_ms']:>12.1f}")
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = {str(result['symbols']): result for result in json.load(f)['results']}
+
+    print(f"\nCompared with {baseline_path} (p50, >1.0 is slower):")
+    for result in results:
+        previous = baseline.get(str(result['symbols']))
+        if previous is None:
+            continue
+        ratios = []
+        for stage, stats in result['stages'].items():
+            old = previous['stages'].get(stage)
+            if old and old['p50_ms'] > 0:
+                ratios.append(f"{stage} {stats['p50_ms'] / old['p50_ms']:.2f}x")
+        print(f"  {result['symbols']} symbols: {', '.join(ratios)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark check_markets end to end against the synthetic provider and a local SMTP sink")
+    parser.add_argument('--sizes', default='10,100,1000,10000', help="Comma-separated symbol counts")
+    parser.add_argument('--cycles', type=int, default=5, help="Measured check cycles per size")
+    parser.add_argument('--warmup', type=int, default=1, help="Unmeasured cycles per size")
+    parser.add_argument('--workers', type=int, default=getattr(Config, 'FETCH_WORKERS', 4))
+    parser.add_argument('--subscribers', type=int, default=0, help="Extra catch-all subscriptions to fan alerts out to")
+    parser.add_argument('--buy', type=float, help="Buy threshold (lower it to produce more alerts)")
+    parser.add_argument('--sell', type=float, help="Sell threshold")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true', help="Trace Python allocations (slows every stage)")
+    parser.add_argument('--output', help=f"Where to store the JSON results (default: {RESULTS_DIR}/pipeline-<timestamp>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    sink = SMTPSink().start()
+    results = []
+    try:
+        for size in (int(size) for size in args.sizes.split(',')):
+            result = run_size(size, args, sink)
+            print_result(result)
+            results.append(result)
+    finally:
+        sink.stop()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'args': vars(args),
+            'results': results
+        }, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
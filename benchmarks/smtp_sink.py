@@ -0,0 +1,66 @@
+import socketserver
+import threading
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: accepts every message and keeps only counts
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self._reply("220 localhost SMTP sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.wfile.write(b"250-localhost\r\n250 SIZE 52428800\r\n")
+            elif command.startswith('HELO') or command.startswith('MAIL') or command.startswith('RSET') or command.startswith('NOOP'):
+                self._reply("250 OK")
+            elif command.startswith('RCPT'):
+                self.server.recipients += 1
+                self._reply("250 OK")
+            elif command == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    size += len(data_line)
+                with self.server.lock:
+                    self.server.messages += 1
+                    self.server.bytes += size
+                self._reply("250 OK queued")
+            elif command == 'QUIT':
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _SinkHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.recipients = 0
+        self.bytes = 0
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='smtp-sink', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,156 @@
+import logging
+import os
+import re
+import threading
+from dotenv import dotenv_values
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def parse_symbols(value):
+    # "SPY:SPDR S&P 500 ETF,VOO" -> {'SPY': 'SPDR S&P 500 ETF', 'VOO': 'VOO'}
+    symbols = {}
+    for item in value.split(','):
+        symbol, _, name = item.partition(':')
+        symbol = symbol.strip().upper()
+        if symbol:
+            symbols[symbol] = name.strip() or symbol
+    if not symbols:
+        raise ValueError("SYMBOLS must list at least one symbol")
+    return symbols
+
+def parse_bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+SETTING_TYPES = {
+    'ALPHA_VANTAGE_API_KEY': str,
+    'SMTP_SERVER': str,
+    'SMTP_PORT': int,
+    'SMTP_USE_TLS': parse_bool,
+    'EMAIL_ADDRESS': str,
+    'EMAIL_PASSWORD': str,
+    'RECIPIENT_EMAIL': str,
+    'BUY_ALERT_THRESHOLD': float,
+    'SELL_ALERT_THRESHOLD': float,
+    'CHECK_INTERVAL': int,
+    'SUMMARY_TIME': str,
+    'MARKET_CALENDAR': str,
+    'MARKET_EDGE_INTERVAL': int,
+    'MARKET_CLOSE_DELAY_MINUTES': int,
+    'SUMMARY_AFTER_CLOSE_MINUTES': int,
+    'ALERT_COOLDOWN_MINUTES': float,
+    'ALERT_DELIVERY_MODE': str,
+    'DIGEST_WINDOW_MINUTES': float,
+    'SYMBOLS': parse_symbols,
+    'SYMBOL_UNIVERSE_FILE': str
+}
+
+class ConfigService:
+    def __init__(self, env_path='.env', poll_interval=5):
+        self.env_path = env_path
+        self.poll_interval = poll_interval
+        self.lock = threading.RLock()
+        self.listeners = []
+        self.mtime = self._current_mtime()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def subscribe(self, listener):
+        # listener(changes) receives {name: new_value} for every setting that changed
+        self.listeners.append(listener)
+
+    def _current_mtime(self):
+        try:
+            return os.path.getmtime(self.env_path)
+        except OSError:
+            return None
+
+    def _parse(self, raw_values):
+        parsed = {}
+        for name, value in raw_values.items():
+            if value is None:
+                continue
+            converter = SETTING_TYPES.get(name)
+            if converter is None:
+                continue
+            try:
+                parsed[name] = converter(value)
+            except ValueError as e:
+                raise ValueError(f"Invalid value for {name}: {value!r} ({e})")
+        return parsed
+
+    def reload(self):
+        with self.lock:
+            self.mtime = self._current_mtime()
+            raw_values = dotenv_values(self.env_path) if self.mtime is not None else {}
+            # Parse everything before touching Config, so a bad value leaves the old settings in place
+            parsed = self._parse(raw_values)
+
+            changes = {name: value for name, value in parsed.items() if getattr(Config, name, None) != value}
+            for name, value in changes.items():
+                setattr(Config, name, value)
+            for name, value in raw_values.items():
+                if value is not None:
+                    os.environ[name] = value
+
+        if changes:
+            logger.info("Configuration reloaded", extra={'changed': sorted(changes)})
+            for listener in self.listeners:
+                try:
+                    listener(changes)
+                except Exception:
+                    logger.exception("Failed to apply configuration change")
+        return changes
+
+    def update(self, settings):
+        # Merge into .env: existing keys are rewritten in place, comments and unknown keys are kept
+        with self.lock:
+            self._parse(settings)
+            lines = []
+            if os.path.exists(self.env_path):
+                with open(self.env_path, 'r') as f:
+                    lines = f.readlines()
+
+            remaining = dict(settings)
+            merged = []
+            for line in lines:
+                match = re.match(r'\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)\s*=', line)
+                if match and match.group(1) in remaining:
+                    name = match.group(1)
+                    merged.append(f"{name}={self._format_value(remaining.pop(name))}\n")
+                else:
+                    merged.append(line if line.endswith('\n') else f"{line}\n")
+
+            for name, value in remaining.items():
+                merged.append(f"{name}={self._format_value(value)}\n")
+
+            tmp_path = f"{self.env_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.writelines(merged)
+            os.replace(tmp_path, self.env_path)
+
+            return self.reload()
+
+    def _format_value(self, value):
+        value = str(value)
+        if re.search(r'[\s#"\']', value):
+            return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        return value
+
+    def start_watching(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._watch, name='config-watcher', daemon=True)
+        self.thread.start()
+
+    def stop_watching(self):
+        self.stop_event.set()
+
+    def _watch(self):
+        while not self.stop_event.wait(self.poll_interval):
+            if self._current_mtime() != self.mtime:
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error("Ignoring invalid configuration", extra={'error': str(e)})
@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+class CooldownStore:
+    def __init__(self, path, default_minutes=60, overrides=None, purge_interval=3600):
+        # overrides maps 'SYMBOL_SIGNAL', 'SYMBOL' or 'SIGNAL' to a cooldown in minutes
+        self.path = path
+        self.default_minutes = default_minutes
+        self.overrides = overrides or {}
+        self.purge_interval = purge_interval
+        self.last_purge = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            # WAL lets main.py and the web monitor thread read while the other writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cooldowns (
+                    alert_key TEXT PRIMARY KEY,
+                    symbol TEXT NOT NULL,
+                    signal TEXT NOT NULL,
+                    sent_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cooldowns_expiry ON cooldowns (expires_at)")
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def cooldown_seconds(self, symbol, signal):
+        for key in (f"{symbol}_{signal}", symbol, signal):
+            if key in self.overrides:
+                return float(self.overrides[key]) * 60
+        return float(self.default_minutes) * 60
+
+    def alert_key(self, symbol, signal, recipient=None):
+        # Subscribers have their own thresholds, so each one cools down separately
+        return f"{symbol}_{signal}_{recipient}" if recipient else f"{symbol}_{signal}"
+
+    def is_active(self, symbol, signal, recipient=None):
+        with self._connection() as conn:
+            row = conn.execute("SELECT expires_at FROM cooldowns WHERE alert_key = ?",
+                               (self.alert_key(symbol, signal, recipient),)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def active(self, alerts):
+        # alerts: (symbol, signal, recipient) tuples; returns the keys of those still cooling down
+        keys = [self.alert_key(*alert) for alert in alerts]
+        if not keys:
+            return set()
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT alert_key FROM cooldowns
+                WHERE alert_key IN (SELECT value FROM json_each(?)) AND expires_at > ?
+            """, (json.dumps(keys), time.time())).fetchall()
+        return {row[0] for row in rows}
+
+    def try_acquire(self, symbol, signal, recipient=None):
+        # Atomically starts a cooldown if none is running; returns its start time, or None if still cooling down
+        return self.try_acquire_many([(symbol, signal, recipient)])[0]
+
+    def try_acquire_many(self, alerts):
+        # Same as try_acquire for each (symbol, signal, recipient), in one transaction
+        now = time.time()
+        started = []
+        with self._connection() as conn:
+            for symbol, signal, recipient in alerts:
+                cursor = conn.execute("""
+                    INSERT INTO cooldowns (alert_key, symbol, signal, sent_at, expires_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (alert_key) DO UPDATE SET sent_at = excluded.sent_at, expires_at = excluded.expires_at
+                    WHERE cooldowns.expires_at <= excluded.sent_at
+                """, (self.alert_key(symbol, signal, recipient), symbol, signal, now, now + self.cooldown_seconds(symbol, signal)))
+                started.append(now if cursor.rowcount == 1 else None)
+
+        if now - self.last_purge > self.purge_interval:
+            self.purge_expired()
+        return started
+
+    def clear(self, symbol, signal, recipient=None):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cooldowns WHERE alert_key = ?", (self.alert_key(symbol, signal, recipient),))
+
+    def purge_expired(self):
+        self.last_purge = time.time()
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cooldowns WHERE expires_at <= ?", (self.last_purge,))
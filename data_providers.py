@@ -0,0 +1,280 @@
+import glob
+import logging
+import os
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+import requests
+from datetime import datetime, timedelta
+from rate_limiter import RateLimiter
+from metrics import API_CALLS, API_ERRORS, THROTTLE_EVENTS
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Every backend returns daily bars as (date, open, high, low, close, volume) tuples, oldest first,
+# with date formatted as YYYY-MM-DD. Everything downstream relies on that order.
+
+THROTTLE_MARKERS = ('call frequency', 'rate limit', 'Thank you for using Alpha Vantage')
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+def get_shared_limiter():
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter(
+                per_minute=getattr(Config, 'ALPHA_VANTAGE_CALLS_PER_MINUTE', 5),
+                per_day=getattr(Config, 'ALPHA_VANTAGE_CALLS_PER_DAY', 25)
+            )
+        return _shared_limiter
+
+
+class DataBackend:
+    name = 'Base'
+    # Remote backends go through the local bar store; local ones are read directly
+    cacheable = False
+    # Symbols per get_bulk_quotes request; 0 means the backend has no multi-symbol quote endpoint
+    bulk_quote_size = 0
+
+    def is_available(self):
+        return True
+
+    def symbols(self):
+        # Symbol universe the backend provides, or None to use Config.SYMBOLS
+        return None
+
+    def get_daily_bars(self, symbol, outputsize='compact'):
+        raise NotImplementedError
+
+    def get_bulk_quotes(self, symbols):
+        # {symbol: (current_price, previous_close, timestamp)} for the symbols the endpoint answered,
+        # or None when bulk quotes are unavailable
+        return None
+
+
+class AlphaVantageBackend(DataBackend):
+    name = 'Alpha Vantage'
+    cacheable = True
+    bulk_quote_size = 100
+
+    def __init__(self, api_key):
+        self.api_key = api_key.strip() if api_key else None
+        self.limiter = get_shared_limiter()
+        self.max_retries = getattr(Config, 'ALPHA_VANTAGE_MAX_RETRIES', 3)
+        self.max_wait = getattr(Config, 'RATE_LIMIT_MAX_WAIT', 120)
+        if not getattr(Config, 'ALPHA_VANTAGE_BULK_QUOTES', True):
+            self.bulk_quote_size = 0
+        self.client = None
+
+        if self.api_key:
+            from alpha_vantage.timeseries import TimeSeries
+            self.client = TimeSeries(key=self.api_key, output_format='pandas')
+        else:
+            logger.warning("No Alpha Vantage API key configured. Get a free key at https://www.alphavantage.co/")
+
+    def is_available(self):
+        return self.client is not None
+
+    def get_daily_bars(self, symbol, outputsize='compact'):
+        for attempt in range(self.max_retries + 1):
+            if not self.limiter.acquire(timeout=self.max_wait):
+                raise RuntimeError("Alpha Vantage request quota exhausted")
+
+            API_CALLS.inc(provider=self.name)
+            try:
+                data, meta_data = self.client.get_daily(symbol=symbol, outputsize=outputsize)
+                return frame_to_bars(data)
+            except ValueError as e:
+                # Throttled responses come back as a "Note"/"Information" payload
+                throttled = any(marker in str(e) for marker in THROTTLE_MARKERS)
+                if throttled:
+                    THROTTLE_EVENTS.inc(provider=self.name)
+                if not throttled or attempt == self.max_retries:
+                    API_ERRORS.inc(provider=self.name)
+                    raise
+                self.limiter.throttled()
+                backoff = 2 ** attempt
+                logger.warning("Alpha Vantage throttled request, backing off",
+                               extra={'symbol': symbol, 'backoff_seconds': backoff})
+                time.sleep(backoff)
+            except Exception:
+                API_ERRORS.inc(provider=self.name)
+                raise
+
+    def get_bulk_quotes(self, symbols):
+        if not self.bulk_quote_size:
+            return None
+        if not self.limiter.acquire(timeout=self.max_wait):
+            raise RuntimeError("Alpha Vantage request quota exhausted")
+
+        API_CALLS.inc(provider=self.name)
+        try:
+            response = requests.get(ALPHA_VANTAGE_URL, params={
+                'function': 'REALTIME_BULK_QUOTES',
+                'symbol': ','.join(symbols),
+                'apikey': self.api_key
+            }, timeout=30)
+            response.raise_for_status()
+            payload = response.json()
+        except Exception:
+            API_ERRORS.inc(provider=self.name)
+            raise
+
+        rows = payload.get('data')
+        if rows is None:
+            message = str(payload.get('Information') or payload.get('Note') or payload.get('message') or payload)
+            if any(marker in message for marker in THROTTLE_MARKERS) and 'premium' not in message.lower():
+                THROTTLE_EVENTS.inc(provider=self.name)
+                self.limiter.throttled()
+                raise RuntimeError(f"Alpha Vantage throttled bulk quotes: {message}")
+            # Bulk quotes are a premium endpoint; stop asking with a key that can't use them
+            self.bulk_quote_size = 0
+            logger.warning("Alpha Vantage bulk quotes unavailable, using per-symbol requests", extra={'reason': message})
+            return None
+
+        quotes = {}
+        for row in rows:
+            try:
+                current_price = float(row['close'])
+                previous_close = float(row['previous_close'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            timestamp = pd.to_datetime(row.get('timestamp'), errors='coerce')
+            quotes[str(row.get('symbol', '')).upper()] = (
+                current_price,
+                previous_close,
+                None if pd.isna(timestamp) else timestamp.to_pydatetime()
+            )
+        return quotes
+
+
+class ReplayBackend(DataBackend):
+    name = 'Replay'
+
+    def __init__(self, directory, speed=0, warmup=30):
+        # speed: bars revealed per second; 0 reveals one more bar per request for that symbol
+        self.directory = directory
+        self.speed = speed
+        self.warmup = warmup
+        self.started_at = time.monotonic()
+        self.bars = {}
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def symbols(self):
+        paths = glob.glob(os.path.join(self.directory, '*.csv')) + glob.glob(os.path.join(self.directory, '*.parquet'))
+        return {os.path.splitext(os.path.basename(path))[0].upper(): 'Replay' for path in sorted(paths)}
+
+    def _load(self, symbol):
+        for extension in ('csv', 'parquet'):
+            path = os.path.join(self.directory, f"{symbol}.{extension}")
+            if os.path.exists(path):
+                frame = pd.read_parquet(path) if extension == 'parquet' else pd.read_csv(path)
+                return frame_to_bars(normalize_frame(frame))
+        return []
+
+    def get_daily_bars(self, symbol, outputsize='compact'):
+        with self.lock:
+            if symbol not in self.bars:
+                self.bars[symbol] = self._load(symbol)
+            self.requests[symbol] = self.requests.get(symbol, -1) + 1
+            requests_made = self.requests[symbol]
+
+        bars = self.bars[symbol]
+        if self.speed:
+            position = self.warmup + int((time.monotonic() - self.started_at) * self.speed)
+        else:
+            position = self.warmup + requests_made
+        visible = bars[:min(position, len(bars))]
+        if outputsize == 'compact':
+            visible = visible[-100:]
+        return visible
+
+
+class SyntheticBackend(DataBackend):
+    name = 'Synthetic'
+
+    def __init__(self, count=100, seed=0, history=120, volatility=0.015):
+        self.count = count
+        self.seed = seed
+        self.history = history
+        self.volatility = volatility
+        self.closes = {}
+        self.lock = threading.Lock()
+
+    def symbols(self):
+        return {f"SYN{i:05d}": f"Synthetic {i}" for i in range(self.count)}
+
+    def _rng(self, symbol):
+        return np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+
+    def get_daily_bars(self, symbol, outputsize='compact'):
+        # Random walk seeded per symbol; each request extends it by one bar
+        with self.lock:
+            state = self.closes.get(symbol)
+            if state is None:
+                rng = self._rng(symbol)
+                closes = 100 * np.exp(np.cumsum(rng.normal(0, self.volatility, self.history)))
+                # Dates are fixed when the walk starts, so every new bar gets the next day
+                start = datetime.now().date() - timedelta(days=self.history - 1)
+                state = self.closes[symbol] = {'rng': rng, 'closes': list(closes), 'start': start}
+            else:
+                step = state['rng'].normal(0, self.volatility)
+                state['closes'].append(state['closes'][-1] * float(np.exp(step)))
+            closes = list(state['closes'])
+            start = state['start']
+
+        if outputsize == 'compact':
+            start += timedelta(days=max(0, len(closes) - 100))
+            closes = closes[-100:]
+        bars = []
+        for age, close in enumerate(closes):
+            date = (start + timedelta(days=age)).strftime('%Y-%m-%d')
+            bars.append((date, close, close * 1.01, close * 0.99, close, 1000000.0))
+        return bars
+
+
+def normalize_frame(frame):
+    # Accept plain OHLCV column names as well as Alpha Vantage's numbered ones
+    frame = frame.rename(columns=lambda column: str(column).lower())
+    for date_column in ('date', 'timestamp', 'time'):
+        if date_column in frame.columns:
+            frame = frame.set_index(date_column)
+            break
+    frame.index = pd.to_datetime(frame.index)
+    renames = {'open': '1. open', 'high': '2. high', 'low': '3. low', 'close': '4. close', 'volume': '5. volume'}
+    frame = frame.rename(columns=renames)
+    for column in renames.values():
+        if column not in frame.columns:
+            frame[column] = frame['4. close'] if column != '5. volume' else 0.0
+    return frame
+
+def frame_to_bars(data):
+    # Alpha Vantage frames come newest first; sorting here is the one place bar order is fixed
+    data = data.sort_index()
+    return [
+        (ts.strftime('%Y-%m-%d'), float(o), float(h), float(l), float(c), float(v))
+        for ts, o, h, l, c, v in zip(data.index, data['1. open'], data['2. high'], data['3. low'], data['4. close'], data['5. volume'])
+    ]
+
+def create_backend(name=None):
+    name = (name or getattr(Config, 'DATA_PROVIDER', 'alpha_vantage')).lower()
+    if name == 'replay':
+        return ReplayBackend(
+            getattr(Config, 'REPLAY_DATA_DIR', os.path.join('data', 'replay')),
+            speed=getattr(Config, 'REPLAY_SPEED', 0),
+            warmup=getattr(Config, 'REPLAY_WARMUP_BARS', 30)
+        )
+    if name == 'synthetic':
+        return SyntheticBackend(
+            count=getattr(Config, 'SYNTHETIC_SYMBOLS', 100),
+            seed=getattr(Config, 'SYNTHETIC_SEED', 0)
+        )
+    if name == 'alpha_vantage':
+        return AlphaVantageBackend(Config.ALPHA_VANTAGE_API_KEY)
+    raise ValueError(f"Unknown data provider: {name}")
@@ -1,54 +1,136 @@
-import smtplib
+import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
+import os
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from smtp_transport import get_transport
+from subscriptions import SubscriptionStore, personalize
+from metrics import EMAILS
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+def signal_color(signal):
+    return "#28a745" if signal == 'BUY' else "#dc3545" if signal == 'SELL' else "#6c757d"
+
+def change_color(change_percent):
+    return "#28a745" if change_percent >= 0 else "#dc3545"
+
+# Compiled once at import; auto_reload is off so rendering never stats the template files
+_templates = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')),
+    autoescape=select_autoescape(default=True),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False
+)
+_templates.globals.update(signal_color=signal_color, change_color=change_color)
+ALERT_TEMPLATE = _templates.get_template('alert.html')
+ALERT_SECTION_TEMPLATE = _templates.get_template('alert_section.html')
+DIGEST_TEMPLATE = _templates.get_template('digest.html')
+SUMMARY_TEMPLATE = _templates.get_template('summary.html')
+
 class EmailNotifier:
     def __init__(self):
+        self.subscriptions = SubscriptionStore(getattr(Config, 'SUBSCRIPTIONS_PATH', os.path.join('data', 'subscriptions.db')))
+        self.apply_config()
+    
+    def apply_config(self):
+        # Called again by the config service; the transport registry hands back a new connection for new credentials
         self.smtp_server = Config.SMTP_SERVER
         self.smtp_port = Config.SMTP_PORT
         self.email_address = Config.EMAIL_ADDRESS
         self.email_password = Config.EMAIL_PASSWORD
         self.recipient_email = Config.RECIPIENT_EMAIL
+        self.transport = get_transport(
+            self.smtp_server,
+            self.smtp_port,
+            self.email_address,
+            self.email_password,
+            use_tls=getattr(Config, 'SMTP_USE_TLS', True),
+            idle_timeout=getattr(Config, 'SMTP_IDLE_TIMEOUT', 60),
+            debug=getattr(Config, 'SMTP_DEBUG', False)
+        )
+    
+    def session(self):
+        return self.transport.session()
     
-    def send_alert(self, analysis):
+    def recipients_for(self, analysis):
+        # Subscribers whose own thresholds give the analysis its signal
+        matches = self.subscriptions.index().match(analysis['symbol'], analysis['change_percent'])
+        return [match.subscription.email for match in matches if match.signal == analysis['signal']]
+    
+    def send_alert(self, analysis, recipients):
+        # analysis is already personalized for the recipients; returns the set they were delivered to
         if not self._validate_config():
-            print("Email configuration incomplete. Cannot send alert.")
-            return False
+            logger.error("Email configuration incomplete, cannot send alert", extra={'symbol': analysis['symbol']})
+            return set()
         
-        try:
+        with self.transport.session():
+            # Rendered once; every recipient's message shares the same part
+            body = MIMEText(self._create_email_body(analysis), 'html')
+            delivered = self._send_to_each(recipients, self._create_subject(analysis), body, 'alert')
+        
+        logger.info("Alert sent", extra={'symbol': analysis['symbol'], 'signal': analysis['signal'],
+                                         'recipients': len(recipients), 'delivered': len(delivered)})
+        return delivered
+    
+    def send_digest(self, analyses, per_recipient):
+        # analyses: {symbol: latest analysis}; per_recipient: {email: {symbol: (signal, confidence)}}.
+        # Returns the set of recipients the digest was delivered to
+        if not per_recipient:
+            return set()
+        
+        if not self._validate_config():
+            logger.error("Email configuration incomplete, cannot send alert digest")
+            return set()
+        
+        # Recipients whose digests would be identical share one rendering
+        groups = {}
+        for email, alerts in per_recipient.items():
+            groups.setdefault(tuple(alerts.items()), []).append(email)
+        
+        section_cache = {}
+        delivered = set()
+        with self.transport.session():
+            for alerts, recipients in groups.items():
+                digest = [personalize(analyses[symbol], signal, confidence) for symbol, (signal, confidence) in alerts]
+                body = MIMEText(self._create_digest_body(digest, section_cache), 'html')
+                delivered |= self._send_to_each(recipients, self._create_digest_subject(digest), body, 'digest')
+        
+        logger.info("Alert digest sent", extra={'alerts': len(analyses), 'recipients': len(per_recipient), 'delivered': len(delivered)})
+        return delivered
+    
+    def _send_to_each(self, recipients, subject, body, kind):
+        delivered = set()
+        for recipient in recipients:
             msg = MIMEMultipart()
             msg['From'] = self.email_address
-            msg['To'] = self.recipient_email
-            msg['Subject'] = self._create_subject(analysis)
-            
-            body = self._create_email_body(analysis)
-            msg.attach(MIMEText(body, 'html'))
+            msg['To'] = recipient
+            msg['Subject'] = subject
+            msg.attach(body)
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_address, self.email_password)
-                server.send_message(msg)
-            
-            print(f"Alert sent for {analysis['symbol']}: {analysis['signal']}")
-            return True
-            
-        except Exception as e:
-            print(f"Failed to send email alert: {e}")
-            return False
+            try:
+                self.transport.send(msg)
+                delivered.add(recipient)
+                EMAILS.inc(kind=kind, outcome='sent')
+            except Exception as e:
+                EMAILS.inc(kind=kind, outcome='failed')
+                logger.warning("Failed to send email", extra={'recipient': recipient, 'kind': kind, 'error': str(e)})
+        return delivered
     
     def send_daily_summary(self, all_analyses):
-        if not self._validate_config():
-            print("Email configuration incomplete. Cannot send summary.")
-            print(f"Email address: {self.email_address}")
-            print(f"Recipient: {self.recipient_email}")
-            print(f"Password set: {'Yes' if self.email_password else 'No'}")
+        if not self._validate_config() or not self.recipient_email:
+            logger.error("Email configuration incomplete, cannot send summary", extra={
+                'email_address': self.email_address,
+                'recipient': self.recipient_email,
+                'password_set': bool(self.email_password)
+            })
             return False
         
         try:
-            print(f"Attempting to send email from {self.email_address} to {self.recipient_email}")
-            
             msg = MIMEMultipart()
             msg['From'] = self.email_address
             msg['To'] = self.recipient_email
@@ -57,30 +139,22 @@ class EmailNotifier:
             body = self._create_summary_body(all_analyses)
             msg.attach(MIMEText(body, 'html'))
             
-            print(f"Connecting to SMTP server: {self.smtp_server}:{self.smtp_port}")
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.set_debuglevel(1)  # Enable debug output
-                print("Starting TLS...")
-                server.starttls()
-                print("Logging in...")
-                server.login(self.email_address, self.email_password)
-                print("Sending message...")
-                server.send_message(msg)
+            self.transport.send(msg)
             
-            print("Daily summary sent successfully")
+            EMAILS.inc(kind='summary', outcome='sent')
+            logger.info("Daily summary sent", extra={'recipient': self.recipient_email, 'smtp_server': self.smtp_server,
+                                                     'symbols': len(all_analyses)})
             return True
             
-        except Exception as e:
-            print(f"Failed to send daily summary: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            EMAILS.inc(kind='summary', outcome='failed')
+            logger.exception("Failed to send daily summary", extra={'smtp_server': self.smtp_server, 'smtp_port': self.smtp_port})
             return False
     
     def _validate_config(self):
         return all([
             self.email_address,
             self.email_password,
-            self.recipient_email,
             self.smtp_server,
             self.smtp_port
         ])
@@ -91,98 +165,28 @@ class EmailNotifier:
         
         return f"{signal_emoji} {analysis['signal']} Alert: {analysis['symbol']} ({confidence} Confidence)"
     
+    def _create_digest_subject(self, analyses):
+        buys = sum(1 for analysis in analyses if analysis['signal'] == 'BUY')
+        sells = sum(1 for analysis in analyses if analysis['signal'] == 'SELL')
+        return f"📊 Alert Digest: {buys} BUY, {sells} SELL ({len(analyses)} symbols)"
+    
     def _create_email_body(self, analysis):
-        signal_color = "#28a745" if analysis['signal'] == 'BUY' else "#dc3545" if analysis['signal'] == 'SELL' else "#6c757d"
-        
-        html = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; margin: 20px;">
-            <h2 style="color: {signal_color};">{analysis['signal']} Alert: {analysis['symbol']}</h2>
-            
-            <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 10px 0;">
-                <h3>Current Market Data</h3>
-                <p><strong>Symbol:</strong> {analysis['symbol']}</p>
-                <p><strong>Current Price:</strong> ${analysis['current_price']:.2f}</p>
-                <p><strong>Change:</strong> <span style="color: {'#28a745' if analysis['change_percent'] >= 0 else '#dc3545'};">
-                    {analysis['change_percent']:+.2f}%</span></p>
-                <p><strong>Signal:</strong> <span style="color: {signal_color}; font-weight: bold;">
-                    {analysis['signal']}</span></p>
-                <p><strong>Confidence:</strong> {analysis['confidence']}</p>
-            </div>
-            
-            <div style="background-color: #e9ecef; padding: 15px; border-radius: 5px; margin: 10px 0;">
-                <h3>Analysis Reasons</h3>
-                <ul>
-        """
-        
-        for reason in analysis['reasons']:
-            html += f"<li>{reason}</li>"
-        
-        if 'technical_signals' in analysis and analysis['technical_signals']:
-            html += "</ul><h4>Technical Indicators</h4><ul>"
-            for signal in analysis['technical_signals']:
-                html += f"<li>{signal}</li>"
-        
-        html += f"""
-                </ul>
-            </div>
-            
-            <div style="margin-top: 20px; font-size: 12px; color: #6c757d;">
-                <p>Alert generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                <p><em>This is an automated alert. Please do your own research before making investment decisions.</em></p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return html
+        return ALERT_TEMPLATE.render(section=self._create_alert_section(analysis), kind="Alert", generated_at=datetime.now())
+    
+    def _create_alert_section(self, analysis, section_cache=None):
+        # section_cache lets digests sent to different groups reuse the sections they have in common
+        key = (analysis['symbol'], analysis['signal'], analysis['confidence'])
+        section = section_cache.get(key) if section_cache is not None else None
+        if section is None:
+            section = Markup(ALERT_SECTION_TEMPLATE.render(analysis=analysis))
+            if section_cache is not None:
+                section_cache[key] = section
+        return section
+    
+    def _create_digest_body(self, analyses, section_cache=None):
+        sections = [self._create_alert_section(analysis, section_cache) for analysis in analyses]
+        return DIGEST_TEMPLATE.render(analyses=analyses, sections=sections, kind="Digest", generated_at=datetime.now())
     
     def _create_summary_body(self, all_analyses):
-        html = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; margin: 20px;">
-            <h2>Daily Stock Market Summary</h2>
-            <p>Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            
-            <table style="border-collapse: collapse; width: 100%; margin: 20px 0;">
-                <thead>
-                    <tr style="background-color: #f8f9fa;">
-                        <th style="border: 1px solid #dee2e6; padding: 10px; text-align: left;">Symbol</th>
-                        <th style="border: 1px solid #dee2e6; padding: 10px; text-align: right;">Price</th>
-                        <th style="border: 1px solid #dee2e6; padding: 10px; text-align: right;">Change %</th>
-                        <th style="border: 1px solid #dee2e6; padding: 10px; text-align: center;">Signal</th>
-                        <th style="border: 1px solid #dee2e6; padding: 10px; text-align: center;">Confidence</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
-        
-        for symbol, analysis in all_analyses.items():
-            if analysis:
-                signal_color = "#28a745" if analysis['signal'] == 'BUY' else "#dc3545" if analysis['signal'] == 'SELL' else "#6c757d"
-                change_color = "#28a745" if analysis['change_percent'] >= 0 else "#dc3545"
-                
-                html += f"""
-                    <tr>
-                        <td style="border: 1px solid #dee2e6; padding: 10px;">{analysis['symbol']}</td>
-                        <td style="border: 1px solid #dee2e6; padding: 10px; text-align: right;">${analysis['current_price']:.2f}</td>
-                        <td style="border: 1px solid #dee2e6; padding: 10px; text-align: right; color: {change_color};">
-                            {analysis['change_percent']:+.2f}%</td>
-                        <td style="border: 1px solid #dee2e6; padding: 10px; text-align: center; color: {signal_color}; font-weight: bold;">
-                            {analysis['signal']}</td>
-                        <td style="border: 1px solid #dee2e6; padding: 10px; text-align: center;">{analysis['confidence']}</td>
-                    </tr>
-                """
-        
-        html += """
-                </tbody>
-            </table>
-            
-            <div style="margin-top: 20px; font-size: 12px; color: #6c757d;">
-                <p><em>This is an automated summary. Please do your own research before making investment decisions.</em></p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return html
\ No newline at end of file
+        # Rows are generated chunk by chunk and joined once instead of growing a string per row
+        return ''.join(SUMMARY_TEMPLATE.generate(analyses=all_analyses.values(), generated_at=datetime.now()))
@@ -0,0 +1,45 @@
+import json
+import queue
+import threading
+
+class EventBroker:
+    def __init__(self, max_queued=100):
+        self.max_queued = max_queued
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.max_queued)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        with self.lock:
+            return subscriber in self.subscribers
+
+    def publish(self, event, data):
+        message = format_sse(event, data)
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # A client that stopped reading is dropped; the browser reconnects and gets a fresh snapshot
+                self.unsubscribe(subscriber)
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def diff_analyses(previous, current):
+    changed = {symbol: analysis for symbol, analysis in current.items() if previous.get(symbol) != analysis}
+    removed = [symbol for symbol in previous if symbol not in current]
+    return changed, removed
@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+import numpy as np
+
+# Numeric columns kept for every analysis; signal/confidence are stored alongside
+SERIES_FIELDS = ('price', 'change_percent', 'sma_20', 'sma_5', 'price_vs_sma20', 'volatility_percent')
+# Downsampling needs the two end points plus at least one in between
+MIN_POINTS, MAX_POINTS = 3, 5000
+
+def lttb(timestamps, values, threshold):
+    # Largest-Triangle-Three-Buckets: indices of the points that best preserve the line's shape
+    count = len(values)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    x = np.asarray(timestamps, dtype=float)
+    y = np.asarray(values, dtype=float)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, count - 1
+    edges = np.linspace(1, count - 1, threshold - 1).astype(int)
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else count
+        if next_end <= next_start:
+            next_end = next_start + 1
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas)) if len(areas) else start
+        selected[i + 1] = previous
+    return np.unique(selected)
+
+def minmax(values, buckets):
+    # Lowest and highest point of each bucket, so spikes survive downsampling
+    count = len(values)
+    if buckets * 2 >= count:
+        return np.arange(count)
+
+    y = np.asarray(values, dtype=float)
+    selected = [0, count - 1]
+    for chunk in np.array_split(np.arange(count), buckets):
+        selected.append(chunk[np.argmin(y[chunk])])
+        selected.append(chunk[np.argmax(y[chunk])])
+    return np.unique(selected)
+
+class HistoryStore:
+    def __init__(self, path, retention_days=365, compact_after_days=7, maintenance_interval=3600):
+        # Rows older than compact_after_days are thinned to the last one per symbol and day plus
+        # any BUY/SELL rows; rows older than retention_days are deleted
+        self.path = path
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+        self.maintenance_interval = maintenance_interval
+        self.last_maintenance = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            # WAL lets the web app chart history while the monitor appends
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS history (
+                    symbol TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    {', '.join(f'{field} REAL' for field in SERIES_FIELDS)},
+                    signal TEXT NOT NULL,
+                    confidence TEXT NOT NULL,
+                    PRIMARY KEY (symbol, ts)
+                ) WITHOUT ROWID
+            """)
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def append(self, analyses, ts=None):
+        # analyses: {symbol: analysis} as produced by MarketAnalyzer
+        ts = ts or time.time()
+        rows = [
+            (symbol, ts, analysis['current_price'], analysis['change_percent'], analysis.get('sma_20'),
+             analysis.get('sma_5'), analysis.get('price_vs_sma20'), analysis.get('volatility_percent'),
+             analysis['signal'], analysis['confidence'])
+            for symbol, analysis in analyses.items()
+        ]
+        if rows:
+            with self._connection() as conn:
+                conn.executemany(f"""
+                    INSERT OR REPLACE INTO history (symbol, ts, {', '.join(SERIES_FIELDS)}, signal, confidence)
+                    VALUES ({', '.join('?' * (len(SERIES_FIELDS) + 4))})
+                """, rows)
+
+        if ts - self.last_maintenance > self.maintenance_interval:
+            self.maintain(ts)
+        return len(rows)
+
+    def maintain(self, now=None):
+        now = now or time.time()
+        self.last_maintenance = now
+        with self._connection() as conn:
+            expired = conn.execute("DELETE FROM history WHERE ts < ?", (now - self.retention_days * 86400,)).rowcount
+            cutoff = now - self.compact_after_days * 86400
+            compacted = conn.execute("""
+                DELETE FROM history WHERE ts < ? AND signal = 'HOLD' AND (symbol, ts) NOT IN (
+                    SELECT symbol, MAX(ts) FROM history WHERE ts < ?
+                    GROUP BY symbol, CAST(ts / 86400 AS INTEGER)
+                )
+            """, (cutoff, cutoff)).rowcount
+        return expired, compacted
+
+    def query(self, symbol, start=None, end=None, points=500, method='lttb'):
+        # Columnar series for symbol in [start, end], downsampled to about `points` rows
+        points = min(max(points, MIN_POINTS), MAX_POINTS)
+        with self._connection() as conn:
+            rows = conn.execute(f"""
+                SELECT ts, {', '.join(SERIES_FIELDS)}, signal, confidence FROM history
+                WHERE symbol = ? AND ts >= ? AND ts <= ? ORDER BY ts
+            """, (symbol, start or 0, end or float('inf'))).fetchall()
+
+        columns = list(zip(*rows)) if rows else [()] * (len(SERIES_FIELDS) + 3)
+        timestamps, prices = columns[0], columns[1]
+        if method == 'minmax':
+            selected = minmax(prices, max(1, points // 2))
+        else:
+            selected = lttb(timestamps, prices, points)
+
+        series = {'timestamps': [timestamps[i] for i in selected]}
+        for offset, field in enumerate(SERIES_FIELDS, start=1):
+            series[field] = [columns[offset][i] for i in selected]
+        series['signal'] = [columns[-2][i] for i in selected]
+        series['confidence'] = [columns[-1][i] for i in selected]
+
+        # Signal changes are always kept, even when downsampling skipped their row
+        signal_changes = []
+        previous = 'HOLD'
+        for ts, price, signal in zip(timestamps, prices, columns[-2]):
+            if signal != previous and signal != 'HOLD':
+                signal_changes.append({'ts': ts, 'price': price, 'signal': signal})
+            previous = signal
+        return {'raw_points': len(rows), 'series': series, 'signal_changes': signal_changes}
@@ -0,0 +1,440 @@
+import math
+from collections import namedtuple
+import numpy as np
+from metrics import CACHE_LOOKUPS
+
+# Declarative indicator pipeline over OHLCV arrays with time along axis 0, oldest -> newest.
+# Inputs are 1-D for one symbol or 2-D (dates x symbols). Every node names the inputs it is
+# computed from, and a run evaluates each node at most once, so RSI, MACD, Bollinger Bands and
+# ATR share the returns, EMAs, true range and running sums they have in common.
+
+NODES = {}
+
+def node(*inputs, warmup=0):
+    # warmup: bars needed before the value means anything; earlier rows are set to NaN
+    def register(func):
+        NODES[func.__name__] = (inputs, func, warmup)
+        return func
+    return register
+
+def _shift(values, periods=1):
+    shifted = np.full_like(values, np.nan)
+    shifted[periods:] = values[:-periods]
+    return shifted
+
+def _ema(values, alpha):
+    # Recursive smoothing like pandas ewm(adjust=False), seeded with the first non-NaN value; a
+    # NaN restarts it. Solved in closed form, y[t] = decay^t * cumsum(weight[i] / decay^i), over
+    # blocks short enough for the powers to stay in floating-point range
+    decay = 1 - alpha
+    size = max(1, int(600 / -math.log(decay)))
+    result = np.empty(values.shape)
+    carry = np.full(values.shape[1:], np.nan)
+    gaps = np.isnan(values)
+    for start in range(0, len(values), size):
+        block, missing = values[start:start + size], gaps[start:start + size]
+        powers = decay ** np.arange(len(block)).reshape((-1,) + (1,) * (block.ndim - 1))
+        totals = result[start:start + len(block)]
+        np.multiply(block, alpha, out=totals)
+        totals[0] = np.where(np.isnan(carry), block[0], totals[0] + decay * carry)
+        # Values right after a gap seed a new run
+        before = np.nonzero(missing[:-1] & ~missing[1:])
+        seeds = (before[0] + 1,) + before[1:]
+        totals[seeds] = block[seeds]
+        np.copyto(totals, 0.0, where=missing)
+        totals /= powers
+        np.cumsum(totals, axis=0, out=totals)
+        # Runs after an interior gap must not include the totals of the run before it
+        offsets = np.zeros(block.shape)
+        offsets[seeds] = totals[before]
+        if offsets.any():
+            restarts = np.zeros(block.shape, dtype=bool)
+            restarts[seeds] = True
+            rows = np.arange(len(block)).reshape(powers.shape)
+            latest = np.maximum.accumulate(np.where(restarts, rows, 0), axis=0)
+            totals -= np.take_along_axis(offsets, latest, axis=0)
+        totals *= powers
+        np.copyto(totals, np.nan, where=missing)
+        carry = totals[-1]
+    return result
+
+def _prefix(values):
+    # Running totals with a leading zero row, so any window's total is one subtraction
+    totals = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=totals[1:])
+    return totals
+
+def _window(prefix, window):
+    result = np.full((len(prefix) - 1,) + prefix.shape[1:], np.nan)
+    if len(prefix) > window:
+        result[window - 1:] = prefix[window:] - prefix[:-window]
+    return result
+
+def _sma(sums, gaps, window):
+    # Windows containing a missing close stay NaN
+    with np.errstate(invalid='ignore'):
+        return np.where(_window(gaps, window) > 0, np.nan, _window(sums, window) / window)
+
+def _std(sums, squares, gaps, window, ddof):
+    total = _window(sums, window)
+    variance = (_window(squares, window) - total * total / window) / (window - ddof)
+    with np.errstate(invalid='ignore'):
+        return np.where(_window(gaps, window) > 0, np.nan, np.sqrt(np.maximum(variance, 0.0)))
+
+# Shared intermediates
+
+@node('close')
+def prev_close(close):
+    return _shift(close)
+
+@node('close', 'prev_close')
+def change(close, prev_close):
+    return close - prev_close
+
+@node('change')
+def gain(change):
+    return np.maximum(change, 0.0)
+
+@node('change')
+def loss(change):
+    return np.maximum(-change, 0.0)
+
+@node('close')
+def ema_12(close):
+    return _ema(close, 2 / 13)
+
+@node('close')
+def ema_26(close):
+    return _ema(close, 2 / 27)
+
+@node('close')
+def close_sums(close):
+    return _prefix(np.nan_to_num(close))
+
+@node('close')
+def close_squares(close):
+    return _prefix(np.nan_to_num(close) ** 2)
+
+@node('close')
+def close_gaps(close):
+    return _prefix(np.isnan(close).astype(float))
+
+@node('close_sums', 'close_gaps')
+def sma_5(close_sums, close_gaps):
+    return _sma(close_sums, close_gaps, 5)
+
+@node('close_sums', 'close_gaps')
+def sma_10(close_sums, close_gaps):
+    return _sma(close_sums, close_gaps, 10)
+
+@node('close_sums', 'close_gaps')
+def sma_20(close_sums, close_gaps):
+    return _sma(close_sums, close_gaps, 20)
+
+@node('close_sums', 'close_squares', 'close_gaps')
+def std_10(close_sums, close_squares, close_gaps):
+    return _std(close_sums, close_squares, close_gaps, 10, ddof=1)
+
+@node('close_sums', 'close_squares', 'close_gaps')
+def std_20(close_sums, close_squares, close_gaps):
+    return _std(close_sums, close_squares, close_gaps, 20, ddof=0)
+
+@node('high', 'low', 'prev_close')
+def true_range(high, low, prev_close):
+    # fmax ignores the missing previous close on the first bar
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+# Indicators
+
+@node('change', 'prev_close')
+def change_percent(change, prev_close):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prev_close != 0, change / prev_close * 100, 0.0)
+
+@node('close', 'sma_20')
+def price_vs_sma20(close, sma_20):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (close - sma_20) / sma_20 * 100
+
+@node('std_10', 'sma_10')
+def volatility_percent(std_10, sma_10):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(sma_10 > 0, std_10 / sma_10 * 100, 0.0)
+
+@node('gain')
+def average_gain(gain):
+    # Wilder's smoothing (alpha = 1/14)
+    return _ema(gain, 1 / 14)
+
+@node('loss')
+def average_loss(loss):
+    return _ema(loss, 1 / 14)
+
+@node('average_gain', 'average_loss', warmup=15)
+def rsi_14(average_gain, average_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(average_loss > 0, 100 - 100 / (1 + average_gain / average_loss), 100.0)
+
+@node('ema_12', 'ema_26', warmup=26)
+def macd(ema_12, ema_26):
+    return ema_12 - ema_26
+
+@node('macd', warmup=34)
+def macd_signal(macd):
+    return _ema(macd, 2 / 10)
+
+@node('macd', 'macd_signal')
+def macd_histogram(macd, macd_signal):
+    return macd - macd_signal
+
+@node('macd_histogram')
+def macd_crossover(macd_histogram):
+    # 1 when MACD crossed above its signal line on this bar, -1 when it crossed below
+    previous = _shift(macd_histogram)
+    with np.errstate(invalid='ignore'):
+        return np.where((previous <= 0) & (macd_histogram > 0), 1.0,
+                        np.where((previous >= 0) & (macd_histogram < 0), -1.0, 0.0))
+
+@node('sma_20', 'std_20')
+def bollinger_upper(sma_20, std_20):
+    return sma_20 + 2 * std_20
+
+@node('sma_20', 'std_20')
+def bollinger_lower(sma_20, std_20):
+    return sma_20 - 2 * std_20
+
+@node('close', 'bollinger_upper', 'bollinger_lower')
+def bollinger_percent_b(close, bollinger_upper, bollinger_lower):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (close - bollinger_lower) / (bollinger_upper - bollinger_lower)
+
+@node('true_range', warmup=14)
+def atr_14(true_range):
+    return _ema(true_range, 1 / 14)
+
+@node('atr_14', 'close')
+def atr_percent(atr_14, close):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return atr_14 / close * 100
+
+
+class IndicatorPipeline:
+    def __init__(self, outputs, nodes=None):
+        # The evaluation order is resolved once; run() only computes what the outputs depend on
+        self.nodes = nodes or NODES
+        self.outputs = tuple(outputs)
+        self.order = []
+        for name in self.outputs:
+            self._resolve(name, set())
+
+    def _resolve(self, name, visiting):
+        if name in self.order or name not in self.nodes:
+            # Not a node: an input array such as 'close'
+            return
+        if name in visiting:
+            raise ValueError(f"Indicator dependency cycle at {name}")
+        visiting.add(name)
+        for dependency in self.nodes[name][0]:
+            self._resolve(dependency, visiting)
+        self.order.append(name)
+
+    def run(self, **inputs):
+        values = {name: np.asarray(array, dtype=float) for name, array in inputs.items()}
+        for name in self.order:
+            dependencies, func, warmup = self.nodes[name]
+            missing = [dependency for dependency in dependencies if dependency not in values]
+            if missing:
+                raise ValueError(f"{name} needs inputs {missing}")
+            result = func(*(values[dependency] for dependency in dependencies))
+            if warmup:
+                result[:warmup - 1] = np.nan
+            values[name] = result
+        return {name: values[name] for name in self.outputs}
+
+
+def history_arrays(historical_data):
+    # OHLCV arrays from a StockDataProvider history dict (already oldest -> newest)
+    return {
+        'open': historical_data['opens'],
+        'high': historical_data['highs'],
+        'low': historical_data['lows'],
+        'close': historical_data['closes'],
+        'volume': historical_data['volumes']
+    }
+
+
+# One-bar updates of the nodes above, in plain floats. The recurrences (EMAs, Wilder averages,
+# ATR) and the rolling window sums are carried in an IndicatorState, so each new bar costs the
+# same however long the history is. A state belongs to one window start: the pipeline seeds its
+# EMAs from the first bar it is given, and stepping past that would make the values depend on
+# how many bars a process happened to see.
+
+ROLLING_WINDOWS = (5, 10, 20)
+# Series whose values at the second-newest bar seed an IndicatorState
+STATE_NODES = ('ema_12', 'ema_26', 'macd_signal', 'macd_histogram', 'average_gain', 'average_loss', 'atr_14')
+# Bars needed before every state node is past its warmup
+STATE_MIN_BARS = max(NODES[name][2] for name in STATE_NODES) + 1
+
+IndicatorState = namedtuple('IndicatorState', ('start', 'timestamp', 'bar', 'count', 'recent', 'sums', 'squares', 'gaps') + STATE_NODES)
+
+def _smooth(current, value, alpha):
+    # One step of _ema
+    return value if math.isnan(current) else alpha * value + (1 - alpha) * current
+
+def _divide(numerator, denominator):
+    return numerator / denominator if denominator else math.nan
+
+def _fmax(a, b):
+    if math.isnan(a):
+        return b
+    return a if math.isnan(b) else max(a, b)
+
+def _masked(value, count, name):
+    return value if count >= NODES[name][2] else math.nan
+
+def seed_state(series, timestamps, closes, highs, lows):
+    # State through the second-newest bar, from full pipeline series over the same bars
+    last = len(closes) - 2
+    recent = tuple(float(close) for close in closes[max(0, last - ROLLING_WINDOWS[-1] + 1):last + 1])
+    windows = [recent[-window:] for window in ROLLING_WINDOWS]
+    return IndicatorState(
+        timestamps[0], timestamps[last], (float(closes[last]), float(highs[last]), float(lows[last])), last + 1, recent,
+        tuple(math.fsum(value for value in window if not math.isnan(value)) for window in windows),
+        tuple(math.fsum(value * value for value in window if not math.isnan(value)) for window in windows),
+        tuple(sum(math.isnan(value) for value in window) for window in windows),
+        *(float(series[name][last]) for name in STATE_NODES)
+    )
+
+def advance_state(state, timestamp, close, high, low):
+    # (state including this bar, every node's value at this bar)
+    count = state.count + 1
+    prev_close = state.bar[0]
+    change = close - prev_close
+    values = {'close': close, 'prev_close': prev_close, 'change': change,
+              'gain': max(change, 0.0), 'loss': max(-change, 0.0)}
+
+    sums, squares, gaps = [], [], []
+    for i, window in enumerate(ROLLING_WINDOWS):
+        dropped = state.recent[-window] if len(state.recent) >= window else 0.0
+        sums.append(state.sums[i] + (0.0 if math.isnan(close) else close) - (0.0 if math.isnan(dropped) else dropped))
+        squares.append(state.squares[i] + (0.0 if math.isnan(close) else close * close) -
+                       (0.0 if math.isnan(dropped) else dropped * dropped))
+        gaps.append(state.gaps[i] + math.isnan(close) - math.isnan(dropped))
+        defined = count >= window and not gaps[i]
+        values[f'sma_{window}'] = sums[i] / window if defined else math.nan
+        if window in (10, 20):
+            ddof = 1 if window == 10 else 0
+            variance = (squares[i] - sums[i] * sums[i] / window) / (window - ddof)
+            values[f'std_{window}'] = math.sqrt(max(variance, 0.0)) if defined else math.nan
+
+    values['ema_12'] = _smooth(state.ema_12, close, 2 / 13)
+    values['ema_26'] = _smooth(state.ema_26, close, 2 / 27)
+    values['true_range'] = _fmax(high - low, _fmax(abs(high - prev_close), abs(low - prev_close)))
+    values['change_percent'] = change / prev_close * 100 if prev_close != 0 else 0.0
+    values['price_vs_sma20'] = _divide(close - values['sma_20'], values['sma_20']) * 100
+    values['volatility_percent'] = values['std_10'] / values['sma_10'] * 100 if values['sma_10'] > 0 else 0.0
+
+    values['average_gain'] = _smooth(state.average_gain, values['gain'], 1 / 14)
+    values['average_loss'] = _smooth(state.average_loss, values['loss'], 1 / 14)
+    rsi = 100 - 100 / (1 + values['average_gain'] / values['average_loss']) if values['average_loss'] > 0 else 100.0
+    values['rsi_14'] = _masked(rsi, count, 'rsi_14')
+
+    values['macd'] = _masked(values['ema_12'] - values['ema_26'], count, 'macd')
+    signal = _smooth(state.macd_signal, values['macd'], 2 / 10)
+    values['macd_signal'] = _masked(signal, count, 'macd_signal')
+    histogram = values['macd_histogram'] = values['macd'] - values['macd_signal']
+    previous = state.macd_histogram
+    values['macd_crossover'] = 1.0 if previous <= 0 and histogram > 0 else -1.0 if previous >= 0 and histogram < 0 else 0.0
+
+    values['bollinger_upper'] = values['sma_20'] + 2 * values['std_20']
+    values['bollinger_lower'] = values['sma_20'] - 2 * values['std_20']
+    values['bollinger_percent_b'] = _divide(close - values['bollinger_lower'], values['bollinger_upper'] - values['bollinger_lower'])
+    atr = _smooth(state.atr_14, values['true_range'], 1 / 14)
+    values['atr_14'] = _masked(atr, count, 'atr_14')
+    values['atr_percent'] = _divide(values['atr_14'], close) * 100
+
+    state = IndicatorState(
+        state.start, timestamp, (close, high, low), count, (state.recent + (close,))[-ROLLING_WINDOWS[-1]:],
+        tuple(sums), tuple(squares), tuple(gaps),
+        values['ema_12'], values['ema_26'], signal, histogram, values['average_gain'], values['average_loss'], atr
+    )
+    return state, values
+
+# Everything advance_state reports; pipelines asking for other nodes always run in full
+STEP_OUTPUTS = set(NODES) - {'close_sums', 'close_squares', 'close_gaps'}
+
+
+class IndicatorCache:
+    # Latest indicator values per symbol, always equal to a full pipeline run over the same bars.
+    # Each symbol keeps an IndicatorState through its second-newest bar, so a revised latest bar
+    # (or a new bar while the history still grows from the same first bar) is a single
+    # advance_state step. The full pipeline runs on a cold start, when the window moves on to a
+    # later first bar, or when the bars no longer line up
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.incremental = set(pipeline.outputs) <= STEP_OUTPUTS | {'close'}
+        self.seed_pipeline = IndicatorPipeline(pipeline.outputs + STATE_NODES, pipeline.nodes)
+        self.entries = {}
+        self.states = {}
+
+    def latest(self, historical_data):
+        symbol = historical_data['symbol']
+        timestamps, closes = historical_data['timestamps'], historical_data['closes']
+        key = (len(closes), timestamps[0], timestamps[-1], closes[-1],
+               historical_data['highs'][-1], historical_data['lows'][-1])
+        entry = self.entries.get(symbol)
+        if entry is not None and entry[0] == key:
+            CACHE_LOOKUPS.inc(cache='indicators', result='hit')
+            return entry[1]
+
+        values = self._advance(symbol, historical_data) if self.incremental else None
+        if values is None:
+            CACHE_LOOKUPS.inc(cache='indicators', result='miss')
+            values = self._recompute(symbol, historical_data)
+        else:
+            CACHE_LOOKUPS.inc(cache='indicators', result='update')
+        self.entries[symbol] = (key, values)
+        return values
+
+    def _advance(self, symbol, historical_data):
+        state = self.states.get(symbol)
+        if state is None:
+            return None
+        timestamps, closes = historical_data['timestamps'], historical_data['closes']
+        highs, lows = historical_data['highs'], historical_data['lows']
+
+        if timestamps[0] != state.start:
+            return None
+        # The state's bar is normally second from the end (latest bar revised) or third (one new bar)
+        position = len(timestamps) - 2
+        while position >= 0 and timestamps[position] > state.timestamp:
+            position -= 1
+        if position != state.count - 1 or timestamps[position] != state.timestamp or \
+                (closes[position], highs[position], lows[position]) != state.bar:
+            return None
+
+        for i in range(position + 1, len(timestamps)):
+            advanced, values = advance_state(state, timestamps[i], float(closes[i]), float(highs[i]), float(lows[i]))
+            if i < len(timestamps) - 1:
+                state = advanced
+        # The latest bar can still be revised, so it is never folded into the stored state
+        self.states[symbol] = state
+        return {name: values[name] for name in self.pipeline.outputs}
+
+    def _recompute(self, symbol, historical_data):
+        arrays = history_arrays(historical_data)
+        if not self.incremental or len(arrays['close']) < STATE_MIN_BARS:
+            self.states.pop(symbol, None)
+            results = self.pipeline.run(**arrays)
+        else:
+            results = self.seed_pipeline.run(**arrays)
+            self.states[symbol] = seed_state(results, historical_data['timestamps'], arrays['close'], arrays['high'], arrays['low'])
+        return {name: float(results[name][-1]) for name in self.pipeline.outputs}
+
+    def forget(self, symbols=None):
+        if symbols is None:
+            self.entries.clear()
+            self.states.clear()
+        for symbol in symbols or ():
+            self.entries.pop(symbol, None)
+            self.states.pop(symbol, None)
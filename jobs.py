@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class JobManager:
+    def __init__(self, path, max_workers=2, max_jobs=100):
+        # Jobs are recorded in SQLite so any worker process can report a job another one runs
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.max_jobs = max_jobs
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    submitted_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    result TEXT,
+                    error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)")
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def submit(self, kind, func, *args, **kwargs):
+        job_id = uuid.uuid4().hex
+        with self._connection() as conn:
+            conn.execute("INSERT INTO jobs (id, kind, status, submitted_at) VALUES (?, ?, 'queued', ?)",
+                         (job_id, kind, time.time()))
+            self._prune(conn)
+
+        self.executor.submit(self._run, job_id, kind, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, kind, func, args, kwargs):
+        self._update(job_id, status='running', started_at=time.time())
+        try:
+            result = func(*args, **kwargs)
+            self._update(job_id, status='succeeded', result=json.dumps(result, default=str), finished_at=time.time())
+        except Exception as e:
+            logger.exception("Job failed", extra={'job_id': job_id, 'kind': kind})
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._connection() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _prune(self, conn):
+        # Forget the oldest finished jobs once more than max_jobs are tracked
+        excess = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - self.max_jobs
+        if excess > 0:
+            conn.execute("""
+                DELETE FROM jobs WHERE id IN (
+                    SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at LIMIT ?
+                )
+            """, (excess,))
+
+    def get(self, job_id):
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
@@ -1,73 +1,224 @@
 #!/usr/bin/env python3
 
-import schedule
-import time
+import logging
+import os
 import sys
-from datetime import datetime
+import time
 from stock_data import StockDataProvider
-from market_analyzer import MarketAnalyzer
+from market_analyzer import LOOKBACK_DAYS, MarketAnalyzer
 from email_notifier import EmailNotifier
+from outbox import AlertOutbox, OutboxSender
+from cooldown_store import CooldownStore
+from history_store import HistoryStore
+from subscriptions import personalize
+from monitor_service import MonitorService
+from config_service import ConfigService
+from symbol_universe import get_cycle_counter, load_universe
+from metrics import ALERTS, CACHE_LOOKUPS, CHECK_SECONDS, LAST_CHECK, STAGE_SECONDS, SYMBOLS_CHECKED, start_http_server
+from structured_logging import configure_logging
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 class StockAlertSystem:
     def __init__(self):
         self.data_provider = StockDataProvider()
+        self.latest_analyses = {}
+        # symbol -> (analysis, subscription index) last evaluated for alerts
+        self.alerted = {}
+        self._load_universe()
+        self.cycles = get_cycle_counter(self.universe.worker_index)
         self.analyzer = MarketAnalyzer()
         self.notifier = EmailNotifier()
-        self.last_alerts = {}
+        self.cooldowns = CooldownStore(
+            getattr(Config, 'COOLDOWN_STORE_PATH', os.path.join('data', 'cooldowns.db')),
+            default_minutes=getattr(Config, 'ALERT_COOLDOWN_MINUTES', 60),
+            overrides=getattr(Config, 'ALERT_COOLDOWNS', {})
+        )
+        self.history = HistoryStore(
+            getattr(Config, 'HISTORY_PATH', os.path.join('data', 'history.db')),
+            retention_days=getattr(Config, 'HISTORY_RETENTION_DAYS', 365),
+            compact_after_days=getattr(Config, 'HISTORY_COMPACT_AFTER_DAYS', 7)
+        )
+        self.outbox = AlertOutbox(getattr(Config, 'OUTBOX_PATH', os.path.join('data', 'outbox.db')))
+        self.sender = OutboxSender(
+            self.outbox,
+            self.notifier,
+            delivery_mode=getattr(Config, 'ALERT_DELIVERY_MODE', 'immediate'),
+            digest_window=getattr(Config, 'DIGEST_WINDOW_MINUTES', 0),
+            max_attempts=getattr(Config, 'OUTBOX_MAX_ATTEMPTS', 8),
+            retention_days=getattr(Config, 'OUTBOX_RETENTION_DAYS', 7)
+        )
+    
+    def _load_universe(self):
+        self.universe, self.universe_store = load_universe(self.data_provider.symbols())
+        self.universe_version = self.universe_store.updated_at() if self.universe_store else None
+        self.symbols = self.universe.symbols
+    
+    def _refresh_universe(self):
+        # Picks up `symbol_universe.py import` runs without a restart
+        if self.universe_store and self.universe_store.updated_at() != self.universe_version:
+            self._load_universe()
+            logger.info("Symbol universe reloaded", extra={'symbols': len(self.symbols)})
+    
+    def apply_config(self, changes):
+        # Live components pick up reloaded settings; a check already running finishes with the old ones
+        self.data_provider.apply_config()
+        self.analyzer.apply_config()
+        self.notifier.apply_config()
+        self.cooldowns.default_minutes = getattr(Config, 'ALERT_COOLDOWN_MINUTES', 60)
+        self.sender.delivery_mode = getattr(Config, 'ALERT_DELIVERY_MODE', 'immediate')
+        self.sender.digest_window = getattr(Config, 'DIGEST_WINDOW_MINUTES', 0)
+        if 'SYMBOLS' in changes or 'SYMBOL_UNIVERSE_FILE' in changes:
+            self._load_universe()
+            logger.info("Symbol set changed", extra={'symbols': len(self.symbols)})
     
     def check_markets(self):
-        print(f"\n{'='*50}")
-        print(f"Market Check - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"{'='*50}")
-        
+        started = time.perf_counter()
         all_analyses = {}
-        alerts_sent = 0
+        pending_alerts = []
         
-        for symbol, name in Config.SYMBOLS.items():
-            print(f"\nChecking {symbol} ({name})...")
-            
-            current_data = self.data_provider.get_current_price(symbol)
+        self._refresh_universe()
+        # The config service may swap the universe mid-check
+        universe = self.universe
+        # Hot symbols every check, colder tiers one shard at a time
+        symbols = universe.due(self.cycles.advance())
+        logger.info("Market check started", extra={'symbols_due': len(symbols), 'universe_size': len(universe.symbols)})
+        
+        with STAGE_SECONDS.time(stage='fetch'):
+            # Bars for the indicators, bulk quotes for the current price while the market is open
+            snapshots = self.data_provider.fetch_snapshots(symbols.keys(), days=LOOKBACK_DAYS, live_quotes=True)
+        subscriptions = self.notifier.subscriptions.index()
+        
+        analyze_seconds = 0.0
+        failed = hits = 0
+        for symbol in symbols:
+            current_data, historical_data = snapshots[symbol]
             if not current_data:
-                print(f"Failed to get data for {symbol}")
+                failed += 1
                 continue
             
-            try:
-                historical_data = self.data_provider.get_historical_data(symbol, days=30)
-            except Exception as e:
-                print(f"Historical data failed for {symbol}, continuing with current data only: {e}")
-                historical_data = None
-            
-            analysis = self.analyzer.analyze_stock(current_data, historical_data)
+            stage_started = time.perf_counter()
+            # Unchanged quote and bars (most checks with daily data) reuse the previous analysis
+            analysis, hit = self.analyzer.analyze_memoized(current_data, historical_data)
+            analyze_seconds += time.perf_counter() - stage_started
+            hits += hit
             
             if analysis:
                 all_analyses[symbol] = analysis
-                print(f"Price: ${analysis['current_price']:.2f} ({analysis['change_percent']:+.2f}%)")
-                print(f"Signal: {analysis['signal']} ({analysis['confidence']} confidence)")
+                if not hit:
+                    logger.debug("Analyzed symbol", extra={
+                        'symbol': symbol,
+                        'price': analysis['current_price'],
+                        'change_percent': analysis['change_percent'],
+                        'signal': analysis['signal'],
+                        'confidence': analysis['confidence']
+                    })
+                
+                # Already evaluated against these subscriptions: nothing new to alert on
+                previous = self.alerted.get(symbol)
+                if previous and previous[0] is analysis and previous[1] is subscriptions:
+                    continue
+                self.alerted[symbol] = (analysis, subscriptions)
                 
-                if self.analyzer.should_send_alert(analysis):
-                    alert_key = f"{symbol}_{analysis['signal']}"
-                    
-                    if (alert_key not in self.last_alerts or 
-                        (datetime.now() - self.last_alerts[alert_key]).seconds > 3600):  # 1 hour cooldown
-                        
-                        if self.notifier.send_alert(analysis):
-                            self.last_alerts[alert_key] = datetime.now()
-                            alerts_sent += 1
-                        else:
-                            print(f"Failed to send alert for {symbol}")
-        
-        print(f"\nMarket check complete. Sent {alerts_sent} alerts.")
-        return all_analyses
+                # Subscribers may use their own thresholds, so each one is alerted and cooled down separately
+                matched = set()
+                for match in subscriptions.match(symbol, analysis['change_percent']):
+                    recipient = match.subscription.email
+                    if (recipient, match.signal) not in matched:
+                        matched.add((recipient, match.signal))
+                        pending_alerts.append((recipient, personalize(analysis, match.signal, match.confidence)))
+        
+        STAGE_SECONDS.observe(analyze_seconds, stage='analyze')
+        SYMBOLS_CHECKED.inc(len(all_analyses), result='ok')
+        SYMBOLS_CHECKED.inc(failed, result='failed')
+        CACHE_LOOKUPS.inc(hits, cache='analysis', result='hit')
+        CACHE_LOOKUPS.inc(len(symbols) - failed - hits, cache='analysis', result='miss')
+        
+        with STAGE_SECONDS.time(stage='cooldown'):
+            cooling = self.cooldowns.active([(analysis['symbol'], analysis['signal'], recipient)
+                                             for recipient, analysis in pending_alerts])
+        ALERTS.inc(len(cooling), outcome='cooldown')
+        pending_alerts = [(recipient, analysis) for recipient, analysis in pending_alerts
+                          if self.cooldowns.alert_key(analysis['symbol'], analysis['signal'], recipient) not in cooling]
+        with STAGE_SECONDS.time(stage='enqueue'):
+            alerts_queued = self._enqueue_alerts(pending_alerts)
+        
+        # Unchanged (memoized) analyses are already in the history
+        changed = {symbol: analysis for symbol, analysis in all_analyses.items() if self.latest_analyses.get(symbol) is not analysis}
+        with STAGE_SECONDS.time(stage='history'):
+            try:
+                self.history.append(changed)
+            except Exception as e:
+                logger.error("Failed to record analysis history", extra={'symbols': len(changed), 'error': str(e)})
+        
+        # Symbols outside this check's shards keep their last analysis
+        latest = {**self.latest_analyses, **all_analyses}
+        self.latest_analyses = {symbol: latest[symbol] for symbol in universe.symbols if symbol in latest}
+        dropped = [symbol for symbol in {**self.analyzer.memo, **self.alerted} if symbol not in universe.symbols]
+        self.analyzer.forget(dropped)
+        for symbol in dropped:
+            self.alerted.pop(symbol, None)
+        
+        duration = time.perf_counter() - started
+        CHECK_SECONDS.observe(duration)
+        LAST_CHECK.set(time.time())
+        logger.info("Market check complete", extra={
+            'analyzed': len(all_analyses),
+            'failed': failed,
+            'unchanged': hits,
+            'alerts_queued': alerts_queued,
+            'duration_seconds': round(duration, 3)
+        })
+        return dict(self.latest_analyses)
+    
+    def _enqueue_alerts(self, pending_alerts):
+        # Queued before the cooldowns start: a crash in between sends an alert twice rather than never
+        if not pending_alerts:
+            return 0
+        
+        checked_at = int(time.time() * 1000)
+        alerts = []
+        for recipient, analysis in pending_alerts:
+            symbol, signal = analysis['symbol'], analysis['signal']
+            idempotency_key = f"{self.cooldowns.alert_key(symbol, signal, recipient)}_{checked_at}"
+            alerts.append((idempotency_key, f"{symbol}_{signal}", analysis, recipient))
+        
+        # The whole check is queued in one transaction, so a digest never sees half of it
+        try:
+            alerts_queued = self.outbox.enqueue_many(alerts)
+        except Exception as e:
+            logger.error("Failed to queue alerts", extra={'alerts': len(alerts), 'error': str(e)})
+            for _, analysis in pending_alerts:
+                # Evaluate the symbol again next check even if its data hasn't moved
+                self.alerted.pop(analysis['symbol'], None)
+            return 0
+        
+        try:
+            started = self.cooldowns.try_acquire_many([(analysis['symbol'], analysis['signal'], recipient)
+                                                       for recipient, analysis in pending_alerts])
+        except Exception as e:
+            # The alerts stay queued; only their cooldowns are missing
+            logger.error("Failed to start alert cooldowns", extra={'alerts': len(alerts), 'error': str(e)})
+        else:
+            # Another process started the same cooldowns since they were checked: its alerts win
+            lost = [alert[0] for alert, cooldown_started in zip(alerts, started) if cooldown_started is None]
+            if lost:
+                alerts_queued -= self.outbox.discard(lost)
+                ALERTS.inc(len(lost), outcome='cooldown')
+        
+        ALERTS.inc(alerts_queued, outcome='queued')
+        return alerts_queued
     
     def send_daily_summary(self):
-        print("Sending daily market summary...")
+        logger.info("Sending daily market summary")
         all_analyses = {}
         
-        for symbol in Config.SYMBOLS.keys():
-            current_data = self.data_provider.get_current_price(symbol)
+        # Served from the snapshot cache when a market check just ran
+        snapshots = self.data_provider.fetch_snapshots(self.symbols.keys(), days=LOOKBACK_DAYS)
+        
+        for symbol, (current_data, historical_data) in snapshots.items():
             if current_data:
-                historical_data = self.data_provider.get_historical_data(symbol, days=30)
                 analysis = self.analyzer.analyze_stock(current_data, historical_data)
                 if analysis:
                     all_analyses[symbol] = analysis
@@ -78,39 +229,50 @@ class StockAlertSystem:
     def run_once(self):
         try:
             return self.check_markets()
-        except Exception as e:
-            print(f"Error during market check: {e}")
+        except Exception:
+            logger.exception("Error during market check")
             return {}
     
     def start_monitoring(self):
-        print("Starting Stock Alert System...")
-        print(f"Monitoring symbols: {list(Config.SYMBOLS.keys())}")
-        print(f"Check interval: {Config.CHECK_INTERVAL} minutes")
-        print(f"Buy threshold: {Config.BUY_ALERT_THRESHOLD}%")
-        print(f"Sell threshold: {Config.SELL_ALERT_THRESHOLD}%")
+        logger.info("Starting Stock Alert System", extra={
+            'provider': self.data_provider.backend.name,
+            'symbols': len(self.symbols),
+            'shard_worker': f"{self.universe.worker_index + 1}/{self.universe.worker_count}",
+            'check_interval_minutes': Config.CHECK_INTERVAL,
+            'buy_threshold': Config.BUY_ALERT_THRESHOLD,
+            'sell_threshold': Config.SELL_ALERT_THRESHOLD
+        })
         
-        schedule.every(Config.CHECK_INTERVAL).minutes.do(self.check_markets)
-        schedule.every().day.at("09:00").do(self.send_daily_summary)
+        metrics_port = getattr(Config, 'METRICS_PORT', None)
+        if metrics_port:
+            start_http_server(int(metrics_port))
+            logger.info("Serving metrics", extra={'port': int(metrics_port)})
         
-        print("Performing initial market check...")
-        self.check_markets()
+        # Same scheduler the web app uses; if it already runs elsewhere this process just follows it
+        service = MonitorService(lambda: self)
+        config_service = ConfigService()
+        config_service.subscribe(service.apply_config)
+        config_service.start_watching()
+        service.start()
         
-        print(f"\nSystem running. Next check in {Config.CHECK_INTERVAL} minutes.")
-        print("Press Ctrl+C to stop.\n")
+        print("Press Ctrl+C to stop.")
         
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(60)
+            service.wait()
         except KeyboardInterrupt:
-            print("\nShutting down Stock Alert System...")
+            logger.info("Shutting down Stock Alert System")
+            # Only this process exits: stop() would stop the web app and the other workers too.
+            # Another process takes over as leader if one is running
+            service.shutdown()
             sys.exit(0)
 
 def main():
+    configure_logging()
     if len(sys.argv) > 1:
         if sys.argv[1] == "--test":
             system = StockAlertSystem()
             analyses = system.run_once()
+            system.sender.drain_once()
             print(f"\nTest completed. Found {len(analyses)} valid analyses.")
             return
         elif sys.argv[1] == "--summary":
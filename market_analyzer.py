@@ -1,9 +1,65 @@
-import statistics
+import logging
+import math
+import numpy as np
 from datetime import datetime, timedelta
+from indicators import IndicatorCache, IndicatorPipeline
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+# Bars fetched per analysis: MACD's signal line needs 26 + 9 - 1 of them before it is defined
+LOOKBACK_DAYS = 60
+
+# Indicator values attached to an analysis; the ones a symbol has too few bars for are left out
+TECHNICAL_FIELDS = ('sma_20', 'sma_5', 'price_vs_sma20', 'volatility_percent', 'rsi_14', 'macd', 'macd_signal',
+                    'macd_histogram', 'bollinger_upper', 'bollinger_lower', 'bollinger_percent_b', 'atr_14', 'atr_percent')
+# analyze_batch and the backtest only have closes, so no ATR
+CLOSE_FIELDS = tuple(field for field in TECHNICAL_FIELDS if not field.startswith('atr')) + ('macd_crossover',)
+
+def classify_changes(change_percent, buy_threshold, sell_threshold):
+    # Array form of MarketAnalyzer._classify: BUY/SELL masks plus which of them are HIGH confidence
+    with np.errstate(invalid='ignore'):
+        buy = change_percent <= buy_threshold
+        sell = ~buy & (change_percent >= sell_threshold)
+        strong = (buy & (change_percent <= buy_threshold * 1.5)) | (sell & (change_percent >= sell_threshold * 1.5))
+    return buy, sell, strong
+
+def describe_change(signal, confidence, change_percent):
+    # Reason text for a classified change; also used for subscribers with their own thresholds
+    reasons = []
+
+    if signal == 'BUY':
+        reasons.append(f"Down {abs(change_percent):.2f}% - Good buying opportunity")
+        if confidence == 'HIGH':
+            reasons.append("Significant drop - Strong buy signal")
+
+    elif signal == 'SELL':
+        reasons.append(f"Up {change_percent:.2f}% - Consider taking profits")
+        if confidence == 'HIGH':
+            reasons.append("Major gain - Strong sell signal")
+
+    else:
+        # Even for HOLD, provide some insight
+        if abs(change_percent) < 0.5:
+            reasons.append("Market stable - no significant movement")
+        elif change_percent > 0:
+            reasons.append(f"Up {change_percent:.2f}% - moderate gain")
+        else:
+            reasons.append(f"Down {abs(change_percent):.2f}% - moderate decline")
+
+    return reasons
+
 class MarketAnalyzer:
     def __init__(self):
+        self.apply_config()
+        # symbol -> (fingerprint, analysis) of the last analysis, reused while its inputs are unchanged
+        self.memo = {}
+        # Indicators depend on the bars only, so threshold changes reuse them
+        self.indicators = IndicatorCache(IndicatorPipeline(TECHNICAL_FIELDS + ('close', 'macd_crossover')))
+        self.batch_pipeline = IndicatorPipeline(CLOSE_FIELDS + ('close',))
+    
+    def apply_config(self):
+        # Called again by the config service when thresholds change
         self.buy_threshold = Config.BUY_ALERT_THRESHOLD
         self.sell_threshold = Config.SELL_ALERT_THRESHOLD
     
@@ -21,36 +77,7 @@ class MarketAnalyzer:
         }
         
         change_percent = current_data['change_percent']
-        
-        # Primary analysis based on daily change
-        if change_percent <= self.buy_threshold:
-            analysis['signal'] = 'BUY'
-            analysis['reasons'].append(f"Down {abs(change_percent):.2f}% - Good buying opportunity")
-            
-            if change_percent <= self.buy_threshold * 1.5:
-                analysis['confidence'] = 'HIGH'
-                analysis['reasons'].append("Significant drop - Strong buy signal")
-            else:
-                analysis['confidence'] = 'MEDIUM'
-        
-        elif change_percent >= self.sell_threshold:
-            analysis['signal'] = 'SELL'
-            analysis['reasons'].append(f"Up {change_percent:.2f}% - Consider taking profits")
-            
-            if change_percent >= self.sell_threshold * 1.5:
-                analysis['confidence'] = 'HIGH'
-                analysis['reasons'].append("Major gain - Strong sell signal")
-            else:
-                analysis['confidence'] = 'MEDIUM'
-        
-        else:
-            # Even for HOLD, provide some insight
-            if abs(change_percent) < 0.5:
-                analysis['reasons'].append("Market stable - no significant movement")
-            elif change_percent > 0:
-                analysis['reasons'].append(f"Up {change_percent:.2f}% - moderate gain")
-            else:
-                analysis['reasons'].append(f"Down {abs(change_percent):.2f}% - moderate decline")
+        analysis['signal'], analysis['confidence'], analysis['reasons'] = self._classify(change_percent)
         
         # Add technical analysis if historical data is available
         if historical_data and len(historical_data.get('closes', [])) > 0:
@@ -58,23 +85,83 @@ class MarketAnalyzer:
                 technical_info = self._technical_analysis(historical_data)
                 analysis.update(technical_info)
             except Exception as e:
-                print(f"Technical analysis failed: {e}")
+                logger.warning("Technical analysis failed", extra={'symbol': analysis['symbol'], 'error': str(e)})
         
         return analysis
     
-    def _technical_analysis(self, historical_data):
-        if not historical_data or len(historical_data['closes']) < 20:
-            return {}
+    def fingerprint(self, current_data, historical_data=None):
+        # Everything analyze_stock's result depends on: the quote, the newest and oldest bars and the thresholds
+        history = (None,)
+        if historical_data and historical_data.get('closes'):
+            timestamps, closes = historical_data['timestamps'], historical_data['closes']
+            history = (len(closes), timestamps[0], closes[0], timestamps[-1], closes[-1])
+        return (current_data['current_price'], current_data['change_percent'], history,
+                self.buy_threshold, self.sell_threshold)
+    
+    def analyze_memoized(self, current_data, historical_data=None):
+        # Returns (analysis, hit); hits return the previous analysis object itself
+        if not current_data:
+            return None, False
         
-        closes = historical_data['closes']
-        current_price = closes[-1]
+        symbol = current_data['symbol']
+        fingerprint = self.fingerprint(current_data, historical_data)
+        entry = self.memo.get(symbol)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1], True
         
-        sma_20 = statistics.mean(closes[-20:])
-        sma_5 = statistics.mean(closes[-5:])
+        analysis = self.analyze_stock(current_data, historical_data)
+        if analysis:
+            self.memo[symbol] = (fingerprint, analysis)
+        else:
+            self.memo.pop(symbol, None)
+        return analysis, False
+    
+    def forget(self, symbols=None):
+        # Drops memoized analyses and indicators; symbols=None clears everything
+        if symbols is None:
+            self.memo.clear()
+        for symbol in symbols or ():
+            self.memo.pop(symbol, None)
+        self.indicators.forget(symbols)
+    
+    def _classify(self, change_percent):
+        # Primary analysis based on daily change
+        if change_percent <= self.buy_threshold:
+            signal = 'BUY'
+            confidence = 'HIGH' if change_percent <= self.buy_threshold * 1.5 else 'MEDIUM'
+        elif change_percent >= self.sell_threshold:
+            signal = 'SELL'
+            confidence = 'HIGH' if change_percent >= self.sell_threshold * 1.5 else 'MEDIUM'
+        else:
+            signal = 'HOLD'
+            confidence = 'LOW'
+        
+        return signal, confidence, self._reasons(signal, confidence, change_percent)
+    
+    def _reasons(self, signal, confidence, change_percent):
+        return describe_change(signal, confidence, change_percent)
+    
+    def _technical_analysis(self, historical_data):
+        if not historical_data or not historical_data.get('closes'):
+            return {}
         
-        price_vs_sma20 = ((current_price - sma_20) / sma_20) * 100
+        values = self.indicators.latest(historical_data)
+        if math.isnan(values['sma_20']):
+            return {}
         
+        technical_info = self._technical_fields(values)
+        technical_info['technical_signals'] = self._technical_signals(values)
+        return technical_info
+    
+    def _technical_fields(self, values):
+        return {field: values[field] for field in TECHNICAL_FIELDS if field in values and not math.isnan(values[field])}
+    
+    def _technical_signals(self, values):
+        # values: latest indicator values by name; NaN (not enough bars yet) compares False everywhere
         technical_signals = []
+        current_price = values['close']
+        sma_20 = values['sma_20']
+        sma_5 = values['sma_5']
         
         if current_price < sma_20 * 0.95:
             technical_signals.append("Price significantly below 20-day average - Oversold")
@@ -86,20 +173,70 @@ class MarketAnalyzer:
         elif sma_5 < sma_20:
             technical_signals.append("Short-term trend is bearish")
         
-        volatility = statistics.stdev(closes[-10:]) if len(closes) >= 10 else 0
-        avg_price = statistics.mean(closes[-10:])
-        volatility_percent = (volatility / avg_price) * 100 if avg_price > 0 else 0
+        rsi = values.get('rsi_14', math.nan)
+        if rsi >= 70:
+            technical_signals.append(f"RSI {rsi:.0f} - Overbought")
+        elif rsi <= 30:
+            technical_signals.append(f"RSI {rsi:.0f} - Oversold")
         
+        if values.get('macd_crossover') == 1:
+            technical_signals.append("MACD crossed above its signal line - Bullish momentum")
+        elif values.get('macd_crossover') == -1:
+            technical_signals.append("MACD crossed below its signal line - Bearish momentum")
+        
+        if current_price > values.get('bollinger_upper', math.nan):
+            technical_signals.append("Price above the upper Bollinger Band")
+        elif current_price < values.get('bollinger_lower', math.nan):
+            technical_signals.append("Price below the lower Bollinger Band")
+        
+        volatility_percent = values['volatility_percent']
         if volatility_percent > 3:
             technical_signals.append(f"High volatility ({volatility_percent:.1f}%) - Increased risk")
         
-        return {
-            'sma_20': sma_20,
-            'sma_5': sma_5,
-            'price_vs_sma20': price_vs_sma20,
-            'volatility_percent': volatility_percent,
-            'technical_signals': technical_signals
-        }
+        return technical_signals
+    
+    def analyze_batch(self, price_matrix):
+        # price_matrix: DataFrame of closes, one row per symbol, columns are dates oldest -> newest
+        if price_matrix is None or price_matrix.shape[1] < 2:
+            return {}
+        
+        closes = price_matrix.to_numpy(dtype=float)
+        current = closes[:, -1]
+        previous = closes[:, -2]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change_percent = np.where(previous != 0, (current - previous) / previous * 100, 0.0)
+        
+        # Same indicator pipeline as analyze_stock, run over every symbol at once (dates x symbols).
+        # Symbols with gaps in their 20-day window get no technicals, like analyze_stock
+        latest = {name: series[-1] for name, series in self.batch_pipeline.run(close=closes.T).items()}
+        has_technicals = ~np.isnan(latest['sma_20'])
+        
+        buy, sell, strong = classify_changes(change_percent, self.buy_threshold, self.sell_threshold)
+        signals = np.where(buy, 'BUY', np.where(sell, 'SELL', 'HOLD'))
+        confidences = np.where(strong, 'HIGH', np.where(buy | sell, 'MEDIUM', 'LOW'))
+        valid = ~(np.isnan(current) | np.isnan(previous))
+        
+        analyses = {}
+        for i in np.flatnonzero(valid):
+            symbol = price_matrix.index[i]
+            analysis = {
+                'symbol': symbol,
+                'current_price': float(current[i]),
+                'change_percent': float(change_percent[i]),
+                'signal': str(signals[i]),
+                'confidence': str(confidences[i]),
+                'reasons': self._reasons(signals[i], confidences[i], change_percent[i])
+            }
+            
+            if has_technicals[i]:
+                values = {name: float(column[i]) for name, column in latest.items()}
+                analysis.update(self._technical_fields(values))
+                analysis['technical_signals'] = self._technical_signals(values)
+            
+            analyses[symbol] = analysis
+        
+        return analyses
     
     def should_send_alert(self, analysis):
         if not analysis:
@@ -0,0 +1,189 @@
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from config import Config
+
+# NYSE regular sessions, computed offline from the exchange's holiday rules.
+# One-off closures (national days of mourning, weather) are listed explicitly.
+
+EXCHANGE_TZ = ZoneInfo('America/New_York')
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+SPECIAL_CLOSURES = {
+    date(2012, 10, 29), date(2012, 10, 30),  # Hurricane Sandy
+    date(2018, 12, 5),                       # President George H.W. Bush
+    date(2025, 1, 9),                        # President Jimmy Carter
+}
+
+def _easter(year):
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _nth_weekday(year, month, weekday, n):
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+def _last_weekday(year, month, weekday):
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day):
+    # Saturday holidays move to Friday, Sunday holidays to Monday
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+def nyse_holidays(year):
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),              # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),              # Washington's Birthday
+        _easter(year) - timedelta(days=2),        # Good Friday
+        _last_weekday(year, 5, 0),                # Memorial Day
+        _observed(date(year, 7, 4)),              # Independence Day
+        _nth_weekday(year, 9, 0, 1),              # Labor Day
+        _nth_weekday(year, 11, 3, 4),             # Thanksgiving
+        _observed(date(year, 12, 25)),            # Christmas
+    }
+    # New Year's Day on a Saturday is not made up on the Friday before (NYSE rule 7.2)
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+class MarketCalendar:
+    def __init__(self, tz=EXCHANGE_TZ):
+        self.tz = tz
+        self._holidays = {}
+
+    def is_holiday(self, day):
+        if day.year not in self._holidays:
+            self._holidays[day.year] = nyse_holidays(day.year)
+        return day in self._holidays[day.year] or day in SPECIAL_CLOSURES
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and not self.is_holiday(day)
+
+    def is_early_close(self, day):
+        if not self.is_trading_day(day):
+            return False
+        # July 3rd, the day after Thanksgiving and Christmas Eve close at 13:00
+        if day.month == 7 and day.day == 3:
+            return True
+        if day.month == 11 and day == _nth_weekday(day.year, 11, 3, 4) + timedelta(days=1):
+            return True
+        return day.month == 12 and day.day == 24
+
+    def session(self, day):
+        # (open, close) as aware datetimes, or None when the exchange is closed that day
+        if not self.is_trading_day(day):
+            return None
+        close = EARLY_CLOSE if self.is_early_close(day) else REGULAR_CLOSE
+        return datetime.combine(day, REGULAR_OPEN, self.tz), datetime.combine(day, close, self.tz)
+
+    def _local(self, moment):
+        moment = moment or datetime.now(self.tz)
+        return moment.astimezone(self.tz) if moment.tzinfo else moment.replace(tzinfo=self.tz)
+
+    def is_open(self, moment=None):
+        moment = self._local(moment)
+        session = self.session(moment.date())
+        return session is not None and session[0] <= moment < session[1]
+
+    def next_session(self, moment=None):
+        # The session in progress at moment, or the next one to start
+        moment = self._local(moment)
+        day = moment.date()
+        for _ in range(15):
+            session = self.session(day)
+            if session is not None and moment < session[1]:
+                return session
+            day += timedelta(days=1)
+        raise RuntimeError(f"No trading session found after {moment}")
+
+    def last_close(self, moment=None):
+        moment = self._local(moment)
+        day = moment.date()
+        for _ in range(15):
+            session = self.session(day)
+            if session is not None and session[1] <= moment:
+                return session[1]
+            day -= timedelta(days=1)
+        raise RuntimeError(f"No trading session found before {moment}")
+
+    def is_settled(self, synced_at, delay, moment=None):
+        # True when synced_at (aware datetime) came after the last close had settled and no
+        # session has opened since, i.e. fetching again cannot return anything new
+        moment = self._local(moment)
+        if self.is_open(moment):
+            return False
+        return synced_at >= self.last_close(moment) + delay
+
+def get_calendar():
+    # MARKET_CALENDAR=none keeps the old around-the-clock schedule (e.g. for replay/synthetic data)
+    name = str(getattr(Config, 'MARKET_CALENDAR', 'NYSE')).upper()
+    return None if name in ('', 'NONE', 'OFF') else MarketCalendar()
+
+class SessionScheduler:
+    # Same run_pending() interface as schedule.Scheduler, driven by exchange sessions:
+    # checks every interval while open (edge_interval near open and close), one check
+    # shortly after the close, nothing overnight, and the summary a fixed time after the close
+    def __init__(self, calendar, run_check, send_summary, interval, edge_interval=5, edge_window=30,
+                 close_delay=15, summary_delay=30):
+        self.calendar = calendar
+        self.run_check = run_check
+        self.send_summary = send_summary
+        self.interval = timedelta(minutes=interval)
+        self.edge_interval = timedelta(minutes=min(edge_interval, interval))
+        self.edge_window = timedelta(minutes=edge_window)
+        self.close_delay = timedelta(minutes=close_delay)
+        self.summary_delay = timedelta(minutes=summary_delay)
+        now = datetime.now(calendar.tz)
+        self.next_check_at = self._next_check(now)
+        self.next_summary_at = self._next_summary(now)
+
+    def _next_check(self, now):
+        settled_at = self.calendar.last_close(now) + self.close_delay
+        if now < settled_at:
+            # One more check once the closing prints are in
+            return settled_at
+        open_at, close_at = self.calendar.next_session(now)
+        if now < open_at:
+            return open_at
+        if now - open_at < self.edge_window or close_at - now <= self.edge_window:
+            return min(now + self.edge_interval, close_at)
+        # Regular steps stop where the closing window starts, so its cadence begins on time
+        return min(now + self.interval, close_at - self.edge_window)
+
+    def _next_summary(self, now):
+        summary_at = self.calendar.last_close(now) + self.summary_delay
+        moment = now
+        while summary_at <= now:
+            close_at = self.calendar.next_session(moment)[1]
+            summary_at = close_at + self.summary_delay
+            moment = close_at
+        return summary_at
+
+    def run_pending(self):
+        now = datetime.now(self.calendar.tz)
+        if now >= self.next_check_at:
+            # Scheduled before running so a slow check doesn't delay the next slot
+            self.next_check_at = self._next_check(now + timedelta(seconds=1))
+            self.run_check()
+        if now >= self.next_summary_at:
+            self.next_summary_at = self._next_summary(now + timedelta(seconds=1))
+            self.send_summary()
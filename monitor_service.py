@@ -0,0 +1,298 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+import schedule
+from market_calendar import SessionScheduler, get_calendar
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process coordination, every process schedules for itself
+    fcntl = None
+
+# Replaced wholesale on every change and never mutated, so readers need no lock
+MonitorSnapshot = namedtuple('MonitorSnapshot', ['active', 'last_check_time', 'analyses'])
+
+RESCHEDULE_SETTINGS = {'CHECK_INTERVAL', 'SUMMARY_TIME', 'MARKET_CALENDAR', 'MARKET_EDGE_INTERVAL',
+                       'MARKET_CLOSE_DELAY_MINUTES', 'SUMMARY_AFTER_CLOSE_MINUTES'}
+
+class MonitorService:
+    def __init__(self, system_factory, state_dir=None, poll_interval=2):
+        # Processes sharing state_dir elect one leader through a file lock; only the leader fetches and alerts
+        state_dir = state_dir or getattr(Config, 'MONITOR_STATE_DIR', 'data')
+        os.makedirs(state_dir, exist_ok=True)
+        # Shard workers (SCAN_WORKER_COUNT > 1) each elect their own leader and publish their own results;
+        # start/stop is shared by all of them
+        worker_count = int(getattr(Config, 'SCAN_WORKER_COUNT', 1))
+        suffix = f"-{getattr(Config, 'SCAN_WORKER_INDEX', 0)}" if worker_count > 1 else ''
+        self.state_path = os.path.join(state_dir, f'monitor_state{suffix}.json')
+        self.control_path = os.path.join(state_dir, 'monitor_control.json')
+        self.leader_path = os.path.join(state_dir, f'monitor{suffix}.lock')
+        self.system_factory = system_factory
+        self.poll_interval = poll_interval
+
+        self.system = None
+        self.snapshot = MonitorSnapshot(False, None, {})
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.run_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closing = threading.Event()
+        self.thread = None
+        self.leader_file = None
+        self.scheduler = None
+        self.state_mtime = None
+        self.handled_request = time.time()
+        self.reschedule_requested = False
+
+        self._refresh_from_state()
+
+    def get_system(self):
+        with self.lock:
+            if self.system is None:
+                self.system = self.system_factory()
+            return self.system
+
+    def add_listener(self, listener):
+        # listener(previous_snapshot, snapshot) is called after every change
+        self.listeners.append(listener)
+
+    @property
+    def is_leader(self):
+        return self.leader_file is not None
+
+    def is_fresh(self, max_age_seconds):
+        snapshot = self.snapshot
+        return bool(snapshot.analyses) and snapshot.last_check_time is not None and \
+            (datetime.now() - snapshot.last_check_time).total_seconds() < max_age_seconds
+
+    def start(self):
+        self._update_control(active=True)
+        self.ensure_supervisor()
+        self.wakeup.set()
+
+    def stop(self):
+        self._update_control(active=False)
+        self.wakeup.set()
+
+    def shutdown(self, timeout=30):
+        self.closing.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout)
+        self._resign()
+
+    def wait(self):
+        while not self.closing.wait(1):
+            pass
+
+    def ensure_supervisor(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self._supervise, name='monitor-service', daemon=True)
+            self.thread.start()
+
+    def run_check(self):
+        system = self.get_system()
+        with self.run_lock:
+            analyses = system.run_once()
+        self._publish(analyses)
+        return analyses
+
+    def request_check(self, timeout=300):
+        # Another process leads: ask it to check instead of fetching the same data here
+        if self.is_leader or not self.snapshot.active or fcntl is None:
+            return self.run_check()
+
+        requested_at = time.time()
+        self._update_control(check_requested_at=requested_at)
+        deadline = requested_at + timeout
+        while time.time() < deadline:
+            self._refresh_from_state()
+            snapshot = self.snapshot
+            if snapshot.last_check_time and snapshot.last_check_time.timestamp() >= requested_at:
+                return snapshot.analyses
+            time.sleep(self.poll_interval)
+        return self.run_check()
+
+    def send_summary(self):
+        system = self.get_system()
+        if self.is_fresh(getattr(Config, 'SNAPSHOT_MAX_AGE_MINUTES', Config.CHECK_INTERVAL) * 60):
+            if not system.notifier.send_daily_summary(self.snapshot.analyses):
+                raise RuntimeError("Failed to send daily summary")
+            return
+        with self.run_lock:
+            system.send_daily_summary()
+
+    def apply_config(self, changes):
+        with self.lock:
+            system = self.system
+        if system is not None:
+            system.apply_config(changes)
+        if RESCHEDULE_SETTINGS.intersection(changes):
+            self.reschedule_requested = True
+            self.wakeup.set()
+    
+    def _supervise(self):
+        while not self.closing.is_set():
+            try:
+                self._tick()
+            except Exception:
+                logger.exception("Error in monitor service")
+            # Waits are interruptible, so start/stop take effect immediately
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def _tick(self):
+        control = self._read_json(self.control_path) or {}
+        active = control.get('active', False)
+        self._set_active(active)
+
+        if active and not self.is_leader:
+            self._try_lead()
+        elif not active and self.is_leader:
+            self._resign()
+
+        if not self.is_leader:
+            self._refresh_from_state()
+            return
+
+        if self.scheduler is None:
+            self.scheduler = self._build_scheduler()
+            logger.info("Performing initial market check")
+            self.run_check()
+        elif self.reschedule_requested:
+            # New interval or summary time: rebuild the jobs without an extra check
+            self.scheduler = self._build_scheduler()
+        self.reschedule_requested = False
+
+        requested_at = control.get('check_requested_at', 0)
+        if requested_at > self.handled_request:
+            self.handled_request = requested_at
+            self.run_check()
+
+        self.scheduler.run_pending()
+
+    def _build_scheduler(self):
+        calendar = get_calendar()
+        if calendar is not None:
+            # Poll only while the exchange is open, and send the summary after the actual close
+            return SessionScheduler(
+                calendar, self.run_check, self.send_summary, Config.CHECK_INTERVAL,
+                edge_interval=getattr(Config, 'MARKET_EDGE_INTERVAL', 5),
+                close_delay=getattr(Config, 'MARKET_CLOSE_DELAY_MINUTES', 15),
+                summary_delay=getattr(Config, 'SUMMARY_AFTER_CLOSE_MINUTES', 30)
+            )
+        scheduler = schedule.Scheduler()
+        scheduler.every(Config.CHECK_INTERVAL).minutes.do(self.run_check)
+        scheduler.every().day.at(getattr(Config, 'SUMMARY_TIME', '09:00')).do(self.send_summary)
+        return scheduler
+
+    def _try_lead(self):
+        leader_file = open(self.leader_path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                leader_file.close()
+                return
+
+        self.leader_file = leader_file
+        logger.info("Monitor scheduler running", extra={'pid': os.getpid()})
+        self.get_system().sender.start()
+
+    def _resign(self):
+        if not self.is_leader:
+            return
+
+        self.scheduler = None
+        if self.system is not None:
+            self.system.sender.stop()
+        if fcntl is not None:
+            fcntl.flock(self.leader_file, fcntl.LOCK_UN)
+        self.leader_file.close()
+        self.leader_file = None
+        logger.info("Monitor scheduler stopped", extra={'pid': os.getpid()})
+
+    def _set_active(self, active):
+        with self.lock:
+            previous = self.snapshot
+            if previous.active == active:
+                return
+            self.snapshot = previous._replace(active=active)
+        self._notify(previous, self.snapshot)
+
+    def _publish(self, analyses):
+        with self.lock:
+            previous = self.snapshot
+            self.snapshot = MonitorSnapshot(previous.active, datetime.now(), analyses)
+            snapshot = self.snapshot
+            self._write_json(self.state_path, {
+                'last_check_time': snapshot.last_check_time.isoformat(),
+                'analyses': snapshot.analyses
+            })
+            self.state_mtime = os.path.getmtime(self.state_path)
+        self._notify(previous, snapshot)
+
+    def _refresh_from_state(self):
+        try:
+            mtime = os.path.getmtime(self.state_path)
+        except OSError:
+            return
+        if mtime == self.state_mtime:
+            return
+
+        state = self._read_json(self.state_path)
+        if not state:
+            return
+        with self.lock:
+            previous = self.snapshot
+            self.state_mtime = mtime
+            self.snapshot = MonitorSnapshot(
+                previous.active,
+                datetime.fromisoformat(state['last_check_time']) if state.get('last_check_time') else None,
+                state.get('analyses', {})
+            )
+            snapshot = self.snapshot
+        self._notify(previous, snapshot)
+
+    def _notify(self, previous, snapshot):
+        for listener in self.listeners:
+            try:
+                listener(previous, snapshot)
+            except Exception:
+                logger.exception("Monitor listener failed")
+
+    @contextmanager
+    def _control_lock(self):
+        with open(f"{self.control_path}.lock", 'a+') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _update_control(self, **changes):
+        with self._control_lock():
+            control = self._read_json(self.control_path) or {}
+            control.update(changes)
+            self._write_json(self.control_path, control)
+
+    def _read_json(self, path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp_path, path)
@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from metrics import ALERTS, OUTBOX_PENDING, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class AlertOutbox:
+    def __init__(self, path, lease_seconds=300):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id TEXT PRIMARY KEY,
+                    alert_key TEXT NOT NULL,
+                    recipient TEXT,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    claimed_at REAL,
+                    created_at REAL NOT NULL,
+                    sent_at REAL,
+                    last_error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if 'recipient' not in columns:
+                # Outboxes from before per-recipient delivery; their entries are matched at send time
+                conn.execute("ALTER TABLE outbox ADD COLUMN recipient TEXT")
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def enqueue(self, idempotency_key, alert_key, analysis, recipient=None):
+        # Returns False when the same alert was already queued, so retries and restarts never duplicate it
+        return self.enqueue_many([(idempotency_key, alert_key, analysis, recipient)]) == 1
+
+    def enqueue_many(self, alerts):
+        # alerts: (idempotency_key, alert_key, analysis, recipient) tuples, written in one transaction.
+        # Returns how many were new
+        now = time.time()
+        with self._connection() as conn:
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT OR IGNORE INTO outbox (id, alert_key, recipient, payload, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(idempotency_key, alert_key, recipient, json.dumps(analysis, default=str), now, now)
+                  for idempotency_key, alert_key, analysis, recipient in alerts])
+            return conn.total_changes - before
+
+    def claim_due(self, limit=100):
+        # limit=None claims every due entry
+        now = time.time()
+        if limit is None:
+            limit = -1
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT * FROM outbox
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'sending' AND claimed_at < ?)
+                ORDER BY created_at LIMIT ?
+            """, (now, now - self.lease_seconds, limit)).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row['id']) for row in rows]
+            )
+        return [dict(row, payload=json.loads(row['payload'])) for row in rows]
+
+    def release(self, ids):
+        # Hand claimed entries back untouched, e.g. while a digest window is still open
+        with self._connection() as conn:
+            conn.executemany("UPDATE outbox SET status = 'pending', claimed_at = NULL WHERE id = ?", [(i,) for i in ids])
+
+    def discard(self, ids):
+        # Drops entries the sender hasn't claimed yet; returns how many were dropped
+        with self._connection() as conn:
+            before = conn.total_changes
+            conn.executemany("DELETE FROM outbox WHERE id = ? AND status = 'pending'", [(i,) for i in ids])
+            return conn.total_changes - before
+
+    def mark_sent(self, ids):
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany("UPDATE outbox SET status = 'sent', sent_at = ? WHERE id = ?", [(now, i) for i in ids])
+
+    def mark_failed(self, entry, error, retry_at=None):
+        status = 'pending' if retry_at is not None else 'failed'
+        with self._connection() as conn:
+            conn.execute("""
+                UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+            """, (status, retry_at or time.time(), str(error), entry['id']))
+
+    def pending_count(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+
+    def purge_sent(self, older_than_seconds):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (time.time() - older_than_seconds,))
+
+
+class OutboxSender:
+    def __init__(self, outbox, notifier, delivery_mode='immediate', digest_window=0,
+                 poll_interval=15, max_attempts=8, base_backoff=30, max_backoff=3600,
+                 retention_days=7, purge_interval=3600):
+        # Sent entries are kept retention_days so restarts still see them as delivered, then purged
+        self.outbox = outbox
+        self.notifier = notifier
+        self.delivery_mode = delivery_mode
+        self.digest_window = digest_window
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self.last_purge = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='alert-outbox-sender', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                # Keep draining while batches go out; a batch that sends nothing (digest window
+                # still open, SMTP down) waits for the next poll
+                while self.drain_once() and not self.stop_event.is_set():
+                    pass
+                if time.time() - self.last_purge > self.purge_interval:
+                    self.purge()
+            except Exception:
+                logger.exception("Error in alert outbox sender")
+            self.stop_event.wait(self.poll_interval)
+
+    def purge(self):
+        self.last_purge = time.time()
+        self.outbox.purge_sent(self.retention_days * 86400)
+
+    def _retry(self, entry, error):
+        attempts = entry['attempts'] + 1
+        if attempts >= self.max_attempts:
+            ALERTS.inc(outcome='failed')
+            logger.error("Giving up on alert", extra={'alert_id': entry['id'], 'alert_key': entry['alert_key'],
+                                                      'attempts': attempts, 'error': error})
+            self.outbox.mark_failed(entry, error)
+            return
+        ALERTS.inc(outcome='retried')
+        backoff = min(self.base_backoff * 2 ** entry['attempts'], self.max_backoff)
+        self.outbox.mark_failed(entry, error, retry_at=time.time() + backoff)
+
+    def drain_once(self):
+        # A digest covers every due entry, however many there are
+        entries = self.outbox.claim_due(limit=None if self.delivery_mode == 'digest' else 100)
+        if not entries:
+            return 0
+
+        with STAGE_SECONDS.time(stage='send'):
+            if self.delivery_mode == 'digest':
+                sent = self._send_digest(entries)
+            else:
+                sent = self._send_each(entries)
+        OUTBOX_PENDING.set(self.outbox.pending_count())
+        return sent
+
+    def _send_each(self, entries):
+        # Entries queued together for the same alert and confidence share one rendered email
+        groups = {}
+        for entry in entries:
+            payload = entry['payload']
+            key = (entry['alert_key'], entry['created_at'], payload['confidence'])
+            groups.setdefault(key, []).append(entry)
+
+        sent = 0
+        with self.notifier.session():
+            for group in groups.values():
+                recipients = {}
+                for entry in group:
+                    for recipient in self._recipients(entry):
+                        recipients.setdefault(recipient, []).append(entry)
+                delivered = self.notifier.send_alert(group[0]['payload'], list(recipients)) if recipients else set()
+                sent += self._settle(group, recipients, delivered, "send_alert failed")
+        return sent
+
+    def _send_digest(self, entries):
+        oldest = min(entry['created_at'] for entry in entries)
+        if time.time() - oldest < self.digest_window * 60:
+            self.outbox.release([entry['id'] for entry in entries])
+            return 0
+
+        # A symbol that fired again before the digest went out keeps only its latest analysis,
+        # shown to each recipient with the signal and confidence of their latest entry for it
+        latest = {}
+        per_recipient = {}
+        recipients = {}
+        for entry in sorted(entries, key=lambda entry: entry['created_at']):
+            analysis = entry['payload']
+            latest[analysis['symbol']] = analysis
+            for recipient in self._recipients(entry):
+                per_recipient.setdefault(recipient, {})[analysis['symbol']] = (analysis['signal'], analysis['confidence'])
+                recipients.setdefault(recipient, []).append(entry)
+
+        delivered = self.notifier.send_digest(latest, per_recipient)
+        return self._settle(entries, recipients, delivered, "send_digest failed")
+
+    def _recipients(self, entry):
+        if entry['recipient']:
+            return [entry['recipient']]
+        # Queued before entries were addressed to one recipient each
+        return self.notifier.recipients_for(entry['payload'])
+
+    def _settle(self, entries, recipients, delivered, error):
+        # An entry is sent once all its recipients got it; the others are retried on their own
+        failed = {entry['id'] for recipient, queued in recipients.items() if recipient not in delivered for entry in queued}
+        done = [entry['id'] for entry in entries if entry['id'] not in failed]
+        if done:
+            self.outbox.mark_sent(done)
+            ALERTS.inc(len(done), outcome='sent')
+        for entry in entries:
+            if entry['id'] in failed:
+                self._retry(entry, error)
+        return len(done)
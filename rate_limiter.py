@@ -0,0 +1,59 @@
+import threading
+import time
+
+class TokenBucket:
+    def __init__(self, capacity, period):
+        # capacity tokens are refilled evenly over period seconds
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def drain(self, now):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter:
+    def __init__(self, per_minute=None, per_day=None):
+        self.buckets = []
+        if per_minute:
+            self.buckets.append(TokenBucket(per_minute, 60))
+        if per_day:
+            self.buckets.append(TokenBucket(per_day, 86400))
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = max([bucket.wait_time(now) for bucket in self.buckets] or [0.0])
+                if wait == 0:
+                    for bucket in self.buckets:
+                        bucket.take()
+                    return True
+
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def throttled(self):
+        # The provider rejected a call, so assume the current window is used up
+        with self.lock:
+            now = time.monotonic()
+            for bucket in self.buckets[:1]:
+                bucket.drain(now)
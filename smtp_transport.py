@@ -0,0 +1,95 @@
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from metrics import SMTP_SEND_SECONDS
+
+class SMTPTransport:
+    def __init__(self, server, port, username, password, use_tls=True, idle_timeout=60, debug=False):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.idle_timeout = idle_timeout
+        self.debug = debug
+        self.connection = None
+        self.last_used = 0.0
+        self.session_depth = 0
+        self.lock = threading.RLock()
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.server, self.port, timeout=30)
+        try:
+            if self.debug:
+                connection.set_debuglevel(1)
+            connection.ehlo()
+            if self.use_tls:
+                connection.starttls()
+                connection.ehlo()
+            if connection.has_extn('auth'):
+                connection.login(self.username, self.password)
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _get_connection(self):
+        if self.connection is not None and time.monotonic() - self.last_used > self.idle_timeout:
+            # Most servers drop idle sessions, so reconnect instead of failing mid-send
+            self.close()
+        if self.connection is None:
+            self.connection = self._connect()
+        return self.connection
+
+    def send(self, msg):
+        with self.lock:
+            for attempt in range(2):
+                connection = self._get_connection()
+                try:
+                    with SMTP_SEND_SECONDS.time():
+                        connection.send_message(msg)
+                    self.last_used = time.monotonic()
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    self.close()
+                    if attempt == 1:
+                        raise
+                except Exception:
+                    # The session may be stuck mid-transaction; the next message gets a new one
+                    self.close()
+                    raise
+
+    @contextmanager
+    def session(self):
+        # Reuse one authenticated connection for every message sent inside the block
+        with self.lock:
+            self.session_depth += 1
+            try:
+                yield self
+            finally:
+                self.session_depth -= 1
+                if self.session_depth == 0:
+                    self.close()
+
+    def close(self):
+        with self.lock:
+            if self.connection is None:
+                return
+            try:
+                self.connection.quit()
+            except Exception:
+                pass
+            self.connection = None
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+def get_transport(server, port, username, password, **options):
+    # One pooled connection per account and server, shared by every notifier in the process
+    key = (server, port, username, password, tuple(sorted(options.items())))
+    with _transports_lock:
+        if key not in _transports:
+            _transports[key] = SMTPTransport(server, port, username, password, **options)
+        return _transports[key]
@@ -1,80 +1,221 @@
-import requests
+import calendar
+import logging
+import os
+import threading
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from alpha_vantage.timeseries import TimeSeries
+from bar_store import BarStore
+from data_providers import create_backend
+from market_calendar import EXCHANGE_TZ, get_calendar
+from metrics import CACHE_LOOKUPS
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+# Alpha Vantage 'compact' responses cover the last 100 trading days (~140 calendar days)
+COMPACT_WINDOW_DAYS = 140
+
 class StockDataProvider:
-    def __init__(self):
-        self.use_alpha_vantage = Config.ALPHA_VANTAGE_API_KEY is not None and Config.ALPHA_VANTAGE_API_KEY.strip()
+    def __init__(self, backend=None):
+        self.backend = backend or create_backend()
+        self.bar_store = BarStore(getattr(Config, 'BAR_STORE_PATH', os.path.join('data', 'bars.db'))) if self.backend.cacheable else None
+        self.refresh_interval = getattr(Config, 'BAR_REFRESH_MINUTES', 15) * 60
+        self.snapshot_ttl = getattr(Config, 'SNAPSHOT_CACHE_SECONDS', 300)
+        self._snapshot_cache = {}
+        self._cache_lock = threading.Lock()
+        self.fetch_workers = getattr(Config, 'FETCH_WORKERS', 4)
+        self.apply_config()
+    
+    def apply_config(self):
+        # Called again by the config service when the calendar settings change
+        self.market_calendar = get_calendar() if self.backend.cacheable else None
+        self.close_delay = timedelta(minutes=getattr(Config, 'MARKET_CLOSE_DELAY_MINUTES', 15))
+    
+    def symbols(self):
+        return self.backend.symbols() or Config.SYMBOLS
+    
+    def _sync_bars(self, symbol):
+        last_synced = self.bar_store.last_synced(symbol)
+        if last_synced and (time.time() - last_synced < self.refresh_interval or self._settled(last_synced)):
+            CACHE_LOOKUPS.inc(cache='bar_store', result='hit')
+            return
+        CACHE_LOOKUPS.inc(cache='bar_store', result='miss')
         
-        if self.use_alpha_vantage:
-            self.av_client = TimeSeries(key=Config.ALPHA_VANTAGE_API_KEY, output_format='pandas')
+        latest_date = self.bar_store.latest_date(symbol)
+        if latest_date is None or (datetime.now() - latest_date).days > COMPACT_WINDOW_DAYS:
+            outputsize = 'full'
         else:
-            print("Warning: No Alpha Vantage API key configured. Get a free key at https://www.alphavantage.co/")
+            outputsize = 'compact'
+        
+        bars = self.backend.get_daily_bars(symbol, outputsize)
+        if latest_date is not None:
+            # Keep the latest stored bar too, it may have been revised since the last sync
+            bars = [bar for bar in bars if bar[0] >= latest_date.strftime('%Y-%m-%d')]
+        
+        stored = self.bar_store.upsert(symbol, bars)
+        self.bar_store.mark_synced(symbol, time.time())
+        logger.debug("Synced bars", extra={'symbol': symbol, 'bars': stored, 'outputsize': outputsize})
     
-    def get_current_price(self, symbol):
-        if not self.use_alpha_vantage:
-            print(f"Cannot get data for {symbol}: No Alpha Vantage API key configured")
-            return None
-            
+    def _settled(self, last_synced):
+        # Synced after the last close settled and the market hasn't reopened: no new bar can exist
+        if self.market_calendar is None:
+            return False
+        return self.market_calendar.is_settled(datetime.fromtimestamp(last_synced, EXCHANGE_TZ), self.close_delay)
+    
+    def _load_bars(self, symbol, limit):
+        if self.bar_store is None:
+            return self.backend.get_daily_bars(symbol, 'compact' if limit <= 100 else 'full')[-limit:]
+        
         try:
-            import time
-            time.sleep(0.5)  # Alpha Vantage rate limit protection
-            
-            data, meta_data = self.av_client.get_daily(symbol=symbol, outputsize='compact')
-            if not data.empty:
-                current_price = data['4. close'].iloc[0]
-                previous_close = data['4. close'].iloc[1] if len(data) > 1 else current_price
-                change = current_price - previous_close
-                change_percent = (change / previous_close) * 100 if previous_close != 0 else 0
-                
-                return {
-                    'symbol': symbol,
-                    'current_price': float(current_price),
-                    'previous_close': float(previous_close),
-                    'change': float(change),
-                    'change_percent': float(change_percent),
-                    'timestamp': datetime.now(),
-                    'source': 'Alpha Vantage'
-                }
+            self._sync_bars(symbol)
         except Exception as e:
-            print(f"Alpha Vantage failed for {symbol}: {e}")
+            logger.warning("Bar sync failed, using stored bars",
+                           extra={'symbol': symbol, 'provider': self.backend.name, 'error': str(e)})
         
-        print(f"Failed to get data for {symbol}")
-        return None
+        return self.bar_store.get_bars(symbol, limit)
     
-    def get_historical_data(self, symbol, days=30):
-        if not self.use_alpha_vantage:
-            print(f"Cannot get historical data for {symbol}: No Alpha Vantage API key configured")
-            return None
-            
+    def _quote_from_bars(self, symbol, bars):
+        current_price = bars[-1][4]
+        previous_close = bars[-2][4] if len(bars) > 1 else current_price
+        return self._make_quote(symbol, current_price, previous_close)
+    
+    def _make_quote(self, symbol, current_price, previous_close, timestamp=None):
+        change = current_price - previous_close
+        change_percent = (change / previous_close) * 100 if previous_close != 0 else 0
+        
+        return {
+            'symbol': symbol,
+            'current_price': float(current_price),
+            'previous_close': float(previous_close),
+            'change': float(change),
+            'change_percent': float(change_percent),
+            'timestamp': timestamp or datetime.now(),
+            'source': self.backend.name
+        }
+    
+    def _history_from_bars(self, symbol, bars):
+        return {
+            'symbol': symbol,
+            'timestamps': [calendar.timegm(datetime.strptime(bar[0], '%Y-%m-%d').timetuple()) for bar in bars],
+            'closes': [bar[4] for bar in bars],
+            'highs': [bar[2] for bar in bars],
+            'lows': [bar[3] for bar in bars],
+            'opens': [bar[1] for bar in bars],
+            'volumes': [bar[5] for bar in bars]
+        }
+    
+    def get_snapshot(self, symbol, days=30):
+        if not self.backend.is_available():
+            logger.error("Data provider is not configured", extra={'symbol': symbol, 'provider': self.backend.name})
+            return None, None
+        
+        with self._cache_lock:
+            cached = self._snapshot_cache.get(symbol)
+        if cached and time.time() - cached['fetched_at'] < self.snapshot_ttl and cached['days'] >= days:
+            history = cached['history']
+            if history and cached['days'] > days:
+                history = {key: (values[-days:] if isinstance(values, list) else values) for key, values in history.items()}
+            CACHE_LOOKUPS.inc(cache='snapshot', result='hit')
+            return cached['quote'], history
+        CACHE_LOOKUPS.inc(cache='snapshot', result='miss')
+        
         try:
-            import time
-            time.sleep(0.5)  # Alpha Vantage rate limit protection
-            
-            data, meta_data = self.av_client.get_daily(symbol=symbol, outputsize='full')
-            if not data.empty:
-                # Get the last 'days' number of entries
-                recent_data = data.head(days)
-                
-                return {
-                    'symbol': symbol,
-                    'timestamps': [int(ts.timestamp()) for ts in recent_data.index],
-                    'closes': recent_data['4. close'].tolist(),
-                    'highs': recent_data['2. high'].tolist(),
-                    'lows': recent_data['3. low'].tolist(),
-                    'opens': recent_data['1. open'].tolist(),
-                    'volumes': recent_data['5. volume'].tolist()
-                }
+            bars = self._load_bars(symbol, max(days, 2))
+            if bars:
+                quote = self._quote_from_bars(symbol, bars)
+                history = self._history_from_bars(symbol, bars[-days:])
+                with self._cache_lock:
+                    self._snapshot_cache[symbol] = {
+                        'fetched_at': time.time(),
+                        'days': days,
+                        'quote': quote,
+                        'history': history
+                    }
+                return quote, history
         except Exception as e:
-            print(f"Alpha Vantage historical data failed for {symbol}: {e}")
+            logger.warning("Snapshot failed", extra={'symbol': symbol, 'provider': self.backend.name, 'error': str(e)})
+        
+        logger.warning("No data for symbol", extra={'symbol': symbol})
+        return None, None
+    
+    def fetch_snapshots(self, symbols, days=30, executor=None, live_quotes=False):
+        # live_quotes: during a session, replace the quotes taken from the daily bars with bulk quotes
+        symbols = list(symbols)
+        fetch = lambda symbol: self.get_snapshot(symbol, days)
+        
+        if executor is not None:
+            snapshots = dict(zip(symbols, executor.map(fetch, symbols)))
+        elif self.fetch_workers <= 1:
+            snapshots = {symbol: fetch(symbol) for symbol in symbols}
+        else:
+            with ThreadPoolExecutor(max_workers=self.fetch_workers) as pool:
+                snapshots = dict(zip(symbols, pool.map(fetch, symbols)))
         
-        return None
+        if live_quotes:
+            quotes = self._bulk_quotes([symbol for symbol, (quote, history) in snapshots.items() if history])
+            for symbol, quote in quotes.items():
+                snapshots[symbol] = (quote, snapshots[symbol][1])
+        return snapshots
+    
+    def get_price_matrix(self, symbols, days=30):
+        # Closes for all symbols in one frame (symbols x dates, oldest -> newest) for MarketAnalyzer.analyze_batch
+        symbols = list(symbols)
+        snapshots = self.fetch_snapshots(symbols, days=days)
+        
+        if self.bar_store is not None:
+            rows = self.bar_store.get_closes(symbols, days)
+        else:
+            rows = [
+                (symbol, timestamp, close)
+                for symbol, (quote, history) in snapshots.items() if history
+                for timestamp, close in zip(history['timestamps'], history['closes'])
+            ]
+        if not rows:
+            return None
+        
+        matrix = pd.DataFrame(rows, columns=['symbol', 'date', 'close']).pivot(index='symbol', columns='date', values='close')
+        return matrix.reindex(index=[symbol for symbol in symbols if symbol in matrix.index]).sort_index(axis=1)
+    
+    def get_current_price(self, symbol):
+        quote, history = self.get_snapshot(symbol, days=2)
+        return quote
+    
+    def get_historical_data(self, symbol, days=30):
+        quote, history = self.get_snapshot(symbol, days=days)
+        return history
     
     def get_multiple_quotes(self, symbols):
+        symbols = list(symbols)
+        results = self._bulk_quotes(symbols)
+        
+        # Symbols the bulk endpoint missed fall back to their daily bars
+        misses = [symbol for symbol in symbols if symbol not in results]
+        if misses:
+            for symbol, (quote, history) in self.fetch_snapshots(misses, days=2).items():
+                if quote:
+                    results[symbol] = quote
+        return results
+    
+    def _bulk_quotes(self, symbols):
+        # One request per chunk of up to bulk_quote_size symbols where the backend supports it;
+        # outside sessions the daily bars already carry the closing price
         results = {}
-        for symbol in symbols:
-            data = self.get_current_price(symbol)
-            if data:
-                results[symbol] = data
-        return results
\ No newline at end of file
+        market_open = self.market_calendar is None or self.market_calendar.is_open()
+        if not (symbols and self.backend.bulk_quote_size and self.backend.is_available() and market_open):
+            return results
+        
+        for start in range(0, len(symbols), self.backend.bulk_quote_size):
+            chunk = symbols[start:start + self.backend.bulk_quote_size]
+            try:
+                quotes = self.backend.get_bulk_quotes(chunk)
+            except Exception as e:
+                logger.warning("Bulk quote request failed", extra={'provider': self.backend.name, 'symbols': len(chunk), 'error': str(e)})
+                continue
+            if quotes is None:
+                break
+            for symbol in chunk:
+                if symbol in quotes:
+                    results[symbol] = self._make_quote(symbol, *quotes[symbol])
+        return results
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from contextlib import contextmanager
+from market_analyzer import describe_change
+from config import Config
+
+# symbols and signals are tuples; ('*',) matches every symbol. Thresholds of None follow the global ones
+Subscription = namedtuple('Subscription', ['id', 'email', 'symbols', 'signals', 'buy_threshold', 'sell_threshold', 'min_confidence'])
+Match = namedtuple('Match', ['subscription', 'signal', 'confidence'])
+
+HIGH_CONFIDENCE_FACTOR = 1.5
+
+class SubscriptionIndex:
+    def __init__(self, subscriptions, buy_threshold, sell_threshold):
+        # Inverted index: (symbol or '*', signal) -> subscriptions sorted by the change that triggers them,
+        # so matching one analysis is a bisect per bucket instead of a scan over every subscription
+        self.subscriptions = list(subscriptions)
+        buckets = {}
+        for subscription in self.subscriptions:
+            for signal in subscription.signals:
+                trigger = self._trigger(subscription, signal, buy_threshold, sell_threshold)
+                if trigger is None:
+                    continue
+                for symbol in subscription.symbols:
+                    buckets.setdefault((symbol, signal), []).append((trigger, subscription))
+
+        self.buckets = {}
+        for key, entries in buckets.items():
+            entries.sort(key=lambda entry: entry[0])
+            self.buckets[key] = ([trigger for trigger, _ in entries], [subscription for _, subscription in entries])
+
+    def _trigger(self, subscription, signal, buy_threshold, sell_threshold):
+        if signal == 'BUY':
+            threshold = buy_threshold if subscription.buy_threshold is None else subscription.buy_threshold
+        elif signal == 'SELL':
+            threshold = sell_threshold if subscription.sell_threshold is None else subscription.sell_threshold
+        else:
+            return None
+        # Same rule as MarketAnalyzer._classify: HIGH confidence starts at 1.5x the threshold
+        factor = HIGH_CONFIDENCE_FACTOR if subscription.min_confidence == 'HIGH' else 1
+        return threshold * factor, threshold
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def match(self, symbol, change_percent):
+        matches = []
+        matched = set()
+        for signal in ('BUY', 'SELL'):
+            for key in ((symbol, signal), ('*', signal)):
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    continue
+                triggers, subscriptions = bucket
+                if signal == 'BUY':
+                    # Triggered when change <= trigger: the tail of the ascending list
+                    start = bisect_left(triggers, (change_percent, float('-inf')))
+                    selected = zip(triggers[start:], subscriptions[start:])
+                else:
+                    end = bisect_right(triggers, (change_percent, float('inf')))
+                    selected = zip(triggers[:end], subscriptions[:end])
+
+                for (_, threshold), subscription in selected:
+                    # BUY wins for a subscriber matched both ways, as in MarketAnalyzer._classify
+                    if subscription.id in matched:
+                        continue
+                    matched.add(subscription.id)
+                    if signal == 'BUY':
+                        strong = change_percent <= threshold * HIGH_CONFIDENCE_FACTOR
+                    else:
+                        strong = change_percent >= threshold * HIGH_CONFIDENCE_FACTOR
+                    matches.append(Match(subscription, signal, 'HIGH' if strong else 'MEDIUM'))
+        return matches
+
+def personalize(analysis, signal, confidence):
+    # The analysis as seen with a subscriber's thresholds; shared by everyone in the same group
+    if analysis['signal'] == signal and analysis['confidence'] == confidence:
+        return analysis
+    personalized = dict(analysis)
+    personalized['signal'] = signal
+    personalized['confidence'] = confidence
+    personalized['reasons'] = describe_change(signal, confidence, analysis['change_percent'])
+    return personalized
+
+class SubscriptionStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.cached_index = None
+        self.cached_key = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    id INTEGER PRIMARY KEY,
+                    email TEXT NOT NULL,
+                    symbols TEXT NOT NULL DEFAULT '*',
+                    signals TEXT NOT NULL DEFAULT 'BUY,SELL',
+                    buy_threshold REAL,
+                    sell_threshold REAL,
+                    min_confidence TEXT NOT NULL DEFAULT 'MEDIUM'
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS subscription_meta (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _touch(self, conn):
+        conn.execute("INSERT OR REPLACE INTO subscription_meta (key, value) VALUES ('updated_at', ?)", (time.time(),))
+
+    def add(self, email, symbols=('*',), signals=('BUY', 'SELL'), buy_threshold=None, sell_threshold=None, min_confidence='MEDIUM'):
+        if min_confidence not in ('MEDIUM', 'HIGH'):
+            raise ValueError(f"min_confidence must be MEDIUM or HIGH, not {min_confidence}")
+        with self._connection() as conn:
+            cursor = conn.execute("""
+                INSERT INTO subscriptions (email, symbols, signals, buy_threshold, sell_threshold, min_confidence)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (email, ','.join(s.upper() for s in symbols), ','.join(s.upper() for s in signals),
+                  buy_threshold, sell_threshold, min_confidence))
+            self._touch(conn)
+            return cursor.lastrowid
+
+    def remove(self, subscription_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM subscriptions WHERE id = ?", (subscription_id,))
+            self._touch(conn)
+
+    def updated_at(self):
+        with self._connection() as conn:
+            row = conn.execute("SELECT value FROM subscription_meta WHERE key = 'updated_at'").fetchone()
+        return row[0] if row else None
+
+    def load(self):
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT id, email, symbols, signals, buy_threshold, sell_threshold, min_confidence
+                FROM subscriptions ORDER BY id
+            """).fetchall()
+        return [Subscription(id, email, tuple(symbols.split(',')), tuple(signals.split(',')), buy, sell, confidence)
+                for id, email, symbols, signals, buy, sell, confidence in rows]
+
+    def index(self):
+        # Rebuilt only when the table or the global thresholds change
+        key = (self.updated_at(), Config.BUY_ALERT_THRESHOLD, Config.SELL_ALERT_THRESHOLD, Config.RECIPIENT_EMAIL)
+        with self.lock:
+            if self.cached_index is None or key != self.cached_key:
+                subscriptions = self.load()
+                if not subscriptions and Config.RECIPIENT_EMAIL:
+                    # No subscriptions yet: everything goes to RECIPIENT_EMAIL, as before
+                    subscriptions = [Subscription(0, Config.RECIPIENT_EMAIL, ('*',), ('BUY', 'SELL'), None, None, 'MEDIUM')]
+                self.cached_index = SubscriptionIndex(subscriptions, Config.BUY_ALERT_THRESHOLD, Config.SELL_ALERT_THRESHOLD)
+                self.cached_key = key
+            return self.cached_index
+
+def _parse_list(value):
+    return tuple(item.strip().upper() for item in value.split(',') if item.strip())
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage alert subscriptions")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add_parser = subparsers.add_parser('add', help="Subscribe an email address")
+    add_parser.add_argument('email')
+    add_parser.add_argument('--symbols', type=_parse_list, default=('*',), help="Comma-separated symbols (default: all)")
+    add_parser.add_argument('--signals', type=_parse_list, default=('BUY', 'SELL'))
+    add_parser.add_argument('--buy', type=float, help="Buy threshold in percent (default: BUY_ALERT_THRESHOLD)")
+    add_parser.add_argument('--sell', type=float, help="Sell threshold in percent (default: SELL_ALERT_THRESHOLD)")
+    add_parser.add_argument('--min-confidence', choices=['MEDIUM', 'HIGH'], default='MEDIUM')
+    remove_parser = subparsers.add_parser('remove', help="Delete a subscription")
+    remove_parser.add_argument('id', type=int)
+    subparsers.add_parser('list', help="List subscriptions")
+    args = parser.parse_args()
+
+    store = SubscriptionStore(getattr(Config, 'SUBSCRIPTIONS_PATH', os.path.join('data', 'subscriptions.db')))
+    if args.command == 'add':
+        subscription_id = store.add(args.email, args.symbols, args.signals, args.buy, args.sell, args.min_confidence)
+        print(f"Added subscription {subscription_id} for {args.email}")
+    elif args.command == 'remove':
+        store.remove(args.id)
+    else:
+        for subscription in store.load():
+            print(f"{subscription.id}: {subscription.email} symbols={','.join(subscription.symbols)} "
+                  f"signals={','.join(subscription.signals)} buy={subscription.buy_threshold} "
+                  f"sell={subscription.sell_threshold} min_confidence={subscription.min_confidence}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
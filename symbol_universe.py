@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+from config import Config
+
+SymbolEntry = namedtuple('SymbolEntry', ['symbol', 'name', 'tags', 'priority'])
+
+# Priority 0 is scanned every check; higher priorities are spread over more checks
+DEFAULT_SCAN_PERIODS = {0: 1, 1: 4, 2: 24}
+
+def read_symbol_file(path, default_priority=1):
+    # CSV with a header: symbol[,name][,tags][,priority]; tags are separated by ';'
+    entries = []
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            symbol = (row.get('symbol') or '').strip().upper()
+            if not symbol:
+                continue
+            tags = tuple(tag.strip() for tag in (row.get('tags') or '').split(';') if tag.strip())
+            priority = int(row['priority']) if (row.get('priority') or '').strip() else default_priority
+            entries.append(SymbolEntry(symbol, (row.get('name') or '').strip() or symbol, tags, priority))
+    return entries
+
+class UniverseStore:
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS symbols (
+                    symbol TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    tags TEXT NOT NULL DEFAULT '',
+                    priority INTEGER NOT NULL DEFAULT 1
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS universe_meta (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def replace_all(self, entries):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM symbols")
+            conn.executemany(
+                "INSERT OR REPLACE INTO symbols (symbol, name, tags, priority) VALUES (?, ?, ?, ?)",
+                [(e.symbol, e.name, ';'.join(e.tags), e.priority) for e in entries]
+            )
+            self._touch(conn)
+
+    def upsert(self, entries):
+        with self._connection() as conn:
+            conn.executemany("""
+                INSERT INTO symbols (symbol, name, tags, priority) VALUES (?, ?, ?, ?)
+                ON CONFLICT (symbol) DO UPDATE SET name = excluded.name, tags = excluded.tags, priority = excluded.priority
+            """, [(e.symbol, e.name, ';'.join(e.tags), e.priority) for e in entries])
+            self._touch(conn)
+
+    def remove(self, symbols):
+        with self._connection() as conn:
+            conn.executemany("DELETE FROM symbols WHERE symbol = ?", [(symbol,) for symbol in symbols])
+            self._touch(conn)
+
+    def _touch(self, conn):
+        conn.execute("INSERT OR REPLACE INTO universe_meta (key, value) VALUES ('updated_at', ?)", (time.time(),))
+
+    def updated_at(self):
+        # Cheap change check, so running monitors can reload after an import
+        with self._connection() as conn:
+            row = conn.execute("SELECT value FROM universe_meta WHERE key = 'updated_at'").fetchone()
+        return row[0] if row else None
+
+    def load(self):
+        with self._connection() as conn:
+            rows = conn.execute("SELECT symbol, name, tags, priority FROM symbols ORDER BY symbol").fetchall()
+        return [SymbolEntry(symbol, name, tuple(t for t in tags.split(';') if t), priority)
+                for symbol, name, tags, priority in rows]
+
+class SymbolUniverse:
+    def __init__(self, entries, scan_periods=None, worker_index=0, worker_count=1):
+        self.scan_periods = {int(k): int(v) for k, v in (scan_periods or DEFAULT_SCAN_PERIODS).items()}
+        self.worker_index = worker_index
+        self.worker_count = max(1, worker_count)
+
+        # Each symbol hashes to a fixed worker and a fixed shard of its priority tier, so
+        # workers and restarts agree on the split without coordinating
+        self.shards = {}
+        self.entries = []
+        for entry in entries:
+            digest = zlib.crc32(entry.symbol.encode())
+            if digest % self.worker_count != worker_index:
+                continue
+            period = self.scan_period(entry.priority)
+            self.shards.setdefault((period, (digest // self.worker_count) % period), []).append(entry)
+            self.entries.append(entry)
+        self.symbols = {entry.symbol: entry.name for entry in self.entries}
+
+    def scan_period(self, priority):
+        if priority in self.scan_periods:
+            return max(1, self.scan_periods[priority])
+        colder = [period for p, period in self.scan_periods.items() if p <= priority]
+        return max(1, max(colder) if colder else 1)
+
+    def due(self, cycle, tags=None):
+        # One shard of every tier per check: tier p is covered once every p checks
+        due = {}
+        for (period, shard), entries in self.shards.items():
+            if cycle % period != shard:
+                continue
+            for entry in entries:
+                if tags and not set(tags) & set(entry.tags):
+                    continue
+                due[entry.symbol] = entry.name
+        return due
+
+    def with_tags(self, tags):
+        wanted = set(tags)
+        return {entry.symbol: entry.name for entry in self.entries if wanted & set(entry.tags)}
+
+class CycleCounter:
+    def __init__(self, path, worker_index=0):
+        # Checks run so far by one worker. Persisted so consecutive checks scan consecutive
+        # shards across restarts, however irregularly the checks are scheduled
+        self.path = path
+        self.worker_index = worker_index
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS scan_cycles (worker INTEGER PRIMARY KEY, cycle INTEGER NOT NULL)")
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def peek(self):
+        # The cycle the next check will scan
+        with self._connection() as conn:
+            row = conn.execute("SELECT cycle FROM scan_cycles WHERE worker = ?", (self.worker_index,)).fetchone()
+        return row[0] if row else 0
+
+    def advance(self):
+        # Claims the next cycle for a check that is about to run
+        with self._connection() as conn:
+            conn.execute("""
+                INSERT INTO scan_cycles (worker, cycle) VALUES (?, 1)
+                ON CONFLICT (worker) DO UPDATE SET cycle = cycle + 1
+            """, (self.worker_index,))
+            row = conn.execute("SELECT cycle FROM scan_cycles WHERE worker = ?", (self.worker_index,)).fetchone()
+        return row[0] - 1
+
+def load_universe(default_symbols):
+    # Sources in order: SYMBOL_UNIVERSE_FILE, the SYMBOL_UNIVERSE_PATH table, then default_symbols (all hot)
+    universe_file = getattr(Config, 'SYMBOL_UNIVERSE_FILE', None)
+    store = None
+    if universe_file:
+        entries = read_symbol_file(universe_file)
+    else:
+        store = UniverseStore(getattr(Config, 'SYMBOL_UNIVERSE_PATH', os.path.join('data', 'universe.db')))
+        entries = store.load()
+    if not entries:
+        entries = [SymbolEntry(symbol, name, (), 0) for symbol, name in default_symbols.items()]
+
+    universe = SymbolUniverse(
+        entries,
+        scan_periods=getattr(Config, 'SCAN_PERIODS', None),
+        worker_index=int(getattr(Config, 'SCAN_WORKER_INDEX', 0)),
+        worker_count=int(getattr(Config, 'SCAN_WORKER_COUNT', 1))
+    )
+    return universe, store
+
+def get_cycle_counter(worker_index=0):
+    return CycleCounter(getattr(Config, 'SCAN_CYCLE_PATH', os.path.join('data', 'scan_cycles.db')), worker_index)
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the symbol universe scanned by the monitor")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Load symbols from a CSV file (symbol,name,tags,priority)")
+    import_parser.add_argument('file')
+    import_parser.add_argument('--merge', action='store_true', help="Keep symbols not listed in the file")
+    remove_parser = subparsers.add_parser('remove', help="Remove symbols")
+    remove_parser.add_argument('symbols', nargs='+')
+    show_parser = subparsers.add_parser('show', help="Print the shard plan for upcoming checks")
+    show_parser.add_argument('--checks', type=int, default=4)
+    args = parser.parse_args()
+
+    store = UniverseStore(getattr(Config, 'SYMBOL_UNIVERSE_PATH', os.path.join('data', 'universe.db')))
+    if args.command == 'import':
+        entries = read_symbol_file(args.file)
+        if args.merge:
+            store.upsert(entries)
+        else:
+            store.replace_all(entries)
+        print(f"Imported {len(entries)} symbols into {store.path}")
+    elif args.command == 'remove':
+        store.remove([symbol.upper() for symbol in args.symbols])
+    else:
+        universe, _ = load_universe(Config.SYMBOLS)
+        cycle = get_cycle_counter(universe.worker_index).peek()
+        print(f"{len(universe.entries)} symbols for worker {universe.worker_index + 1}/{universe.worker_count}")
+        for offset in range(args.checks):
+            due = universe.due(cycle + offset)
+            print(f"Check {cycle + offset}: {len(due)} symbols {json.dumps(sorted(due)[:10])}{' ...' if len(due) > 10 else ''}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
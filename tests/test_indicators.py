@@ -0,0 +1,65 @@
+import os
+import sys
+import types
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py is created per deployment; these tests only need the defaults
+    sys.modules['config'] = types.SimpleNamespace(Config=type('Config', (), {}))
+
+from indicators import IndicatorCache, IndicatorPipeline
+
+OUTPUTS = ('sma_20', 'rsi_14', 'macd', 'macd_signal', 'macd_histogram', 'macd_crossover',
+           'bollinger_percent_b', 'atr_14', 'volatility_percent')
+WINDOW = 60
+
+
+def history(closes, start):
+    return {
+        'symbol': 'TEST',
+        'timestamps': [86400 * day for day in range(start, start + len(closes))],
+        'closes': closes,
+        'highs': [close * 1.01 for close in closes],
+        'lows': [close * 0.99 for close in closes],
+        'opens': closes,
+        'volumes': [1e6] * len(closes)
+    }
+
+
+class IndicatorCacheTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.closes = list(100 * np.exp(np.cumsum(rng.normal(0, 0.02, 200))))
+
+    def assertSameValues(self, warm, cold):
+        for name in OUTPUTS:
+            if np.isnan(cold[name]):
+                self.assertTrue(np.isnan(warm[name]), name)
+            else:
+                self.assertAlmostEqual(warm[name], cold[name], places=8, msg=name)
+
+    def test_warm_cache_matches_cold_over_sliding_window(self):
+        warm = IndicatorCache(IndicatorPipeline(OUTPUTS))
+        for end in range(WINDOW, len(self.closes) + 1):
+            bars = history(self.closes[end - WINDOW:end], end - WINDOW)
+            revised = history(bars['closes'][:-1] + [bars['closes'][-1] * 1.02], end - WINDOW)
+            for data in (bars, revised):
+                cold = IndicatorCache(IndicatorPipeline(OUTPUTS))
+                self.assertSameValues(warm.latest(data), cold.latest(data))
+
+    def test_growing_history_matches_pipeline(self):
+        warm = IndicatorCache(IndicatorPipeline(OUTPUTS))
+        pipeline = IndicatorPipeline(OUTPUTS)
+        for end in range(2, 120):
+            data = history(self.closes[:end], 0)
+            full = pipeline.run(close=data['closes'], high=data['highs'], low=data['lows'])
+            self.assertSameValues(warm.latest(data), {name: float(full[name][-1]) for name in OUTPUTS})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py is created per deployment; these tests only need the defaults
+    sys.modules['config'] = types.SimpleNamespace(Config=type('Config', (), {}))
+
+from market_calendar import EXCHANGE_TZ, MarketCalendar, SessionScheduler
+from symbol_universe import CycleCounter, SymbolEntry, SymbolUniverse
+
+
+def session_checks(start, end, interval=60):
+    # Check times SessionScheduler produces between start and end
+    scheduler = SessionScheduler(MarketCalendar(), None, None, interval)
+    checks = []
+    moment = scheduler._next_check(start)
+    while moment < end:
+        checks.append(moment)
+        moment = scheduler._next_check(moment + timedelta(seconds=1))
+    return checks
+
+
+class ShardCoverageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.counter = CycleCounter(os.path.join(self.tmp.name, 'scan_cycles.db'))
+        entries = [SymbolEntry(f'S{i:03d}', f'S{i:03d}', (), i % 3) for i in range(300)]
+        self.universe = SymbolUniverse(entries)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_every_shard_covered_under_nyse_schedule(self):
+        # Four weeks around Thanksgiving: holidays, an early close and irregular edge checks
+        checks = session_checks(datetime(2024, 11, 18, tzinfo=EXCHANGE_TZ), datetime(2024, 12, 14, tzinfo=EXCHANGE_TZ))
+        scanned = [set(self.universe.due(self.counter.advance())) for _ in checks]
+
+        longest = max(self.universe.shards)[0]
+        self.assertGreater(len(scanned), 2 * longest)
+        for (period, shard), entries in self.universe.shards.items():
+            symbols = {entry.symbol for entry in entries}
+            # Every window of `period` consecutive checks scans the whole tier
+            for start in range(len(scanned) - period + 1):
+                window = set().union(*scanned[start:start + period])
+                self.assertTrue(symbols <= window, f"shard {shard} of period {period} missed at check {start}")
+
+    def test_counter_survives_restart(self):
+        for _ in range(5):
+            self.counter.advance()
+        restarted = CycleCounter(self.counter.path)
+        self.assertEqual(restarted.peek(), 5)
+        self.assertEqual(restarted.advance(), 5)
+        self.assertEqual(CycleCounter(self.counter.path, worker_index=1).peek(), 0)
+
+    def test_edge_windows_use_edge_interval(self):
+        checks = session_checks(datetime(2024, 11, 25, tzinfo=EXCHANGE_TZ), datetime(2024, 11, 26, tzinfo=EXCHANGE_TZ))
+        times = [check.strftime('%H:%M') for check in checks]
+        self.assertEqual(times[:7], ['09:30', '09:35', '09:40', '09:45', '09:50', '09:55', '10:00'])
+        self.assertEqual(times[-8:], ['15:30', '15:35', '15:40', '15:45', '15:50', '15:55', '16:00', '16:15'])
+
+
+if __name__ == '__main__':
+    unittest.main()
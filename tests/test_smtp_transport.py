@@ -0,0 +1,69 @@
+import os
+import smtplib
+import socket
+import sys
+import unittest
+from email.mime.text import MIMEText
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from smtp_sink import SMTPSink
+from smtp_transport import SMTPTransport
+
+
+def message(recipient='someone@localhost'):
+    msg = MIMEText('body')
+    msg['From'] = 'alerts@localhost'
+    msg['To'] = recipient
+    msg['Subject'] = 'test'
+    return msg
+
+
+class SMTPTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.transport = SMTPTransport('127.0.0.1', self.sink.port, 'alerts@localhost', 'secret', use_tls=False)
+
+    def tearDown(self):
+        self.transport.close()
+        self.sink.stop()
+
+    def test_session_reuses_one_connection(self):
+        with self.transport.session():
+            for _ in range(3):
+                self.transport.send(message())
+        self.assertEqual(self.sink.messages, 3)
+        self.assertEqual(self.sink.connections, 1)
+        self.assertIsNone(self.transport.connection)
+
+    def test_reconnects_after_the_server_drops_the_connection(self):
+        with self.transport.session():
+            self.transport.send(message())
+            # The socket goes away under the open session, as when the server times it out
+            self.transport.connection.sock.shutdown(socket.SHUT_RDWR)
+            self.transport.send(message())
+        self.assertEqual(self.sink.messages, 2)
+        self.assertEqual(self.sink.connections, 2)
+
+    def test_failed_send_drops_the_connection(self):
+        with self.transport.session():
+            self.transport.send(message())
+            connection = self.transport.connection
+
+            def refuse(msg):
+                raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'No such user')})
+            connection.send_message = refuse
+            with self.assertRaises(smtplib.SMTPRecipientsRefused):
+                self.transport.send(message())
+            self.assertIsNone(self.transport.connection)
+
+            self.transport.send(message())
+            self.assertIsNot(self.transport.connection, connection)
+        self.assertEqual(self.sink.messages, 2)
+        self.assertEqual(self.sink.connections, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,48 +1,104 @@
 #!/usr/bin/env python3
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash
 from flask_cors import CORS
 import os
-import threading
-import time
+import queue
 from datetime import datetime
 from stock_data import StockDataProvider
 from market_analyzer import MarketAnalyzer
 from email_notifier import EmailNotifier
 from config import Config
 from main import StockAlertSystem
+from events import EventBroker, diff_analyses, format_sse
+from jobs import JobManager
+from monitor_service import MonitorService
+from config_service import ConfigService
+from history_store import MAX_POINTS, MIN_POINTS, HistoryStore
+from metrics import CONTENT_TYPE, REGISTRY
+from structured_logging import configure_logging
+
+configure_logging()
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this'
 CORS(app)
 
-# Global variables to track monitoring state
-monitoring_thread = None
-monitoring_active = False
-alert_system = None
-last_check_time = None
-last_analyses = {}
+# One scheduler per deployment: with several workers only the elected leader fetches,
+# the others follow its published snapshots
+monitor = MonitorService(StockAlertSystem)
+event_broker = EventBroker()
+# Shared by every worker, so a job can be polled from whichever one serves the request
+job_manager = JobManager(getattr(Config, 'JOB_STORE_PATH', os.path.join('data', 'jobs.db')), max_workers=2)
+# Written by the monitor leader after every check; read here for the dashboard charts
+history_store = HistoryStore(getattr(Config, 'HISTORY_PATH', os.path.join('data', 'history.db')))
+
+def status_payload(snapshot=None):
+    snapshot = snapshot or monitor.snapshot
+    return {
+        'monitoring_active': snapshot.active,
+        'last_check_time': snapshot.last_check_time.isoformat() if snapshot.last_check_time else None
+    }
+
+def publish_changes(previous, snapshot):
+    # Push only symbols whose analysis changed since the previous check
+    if snapshot.analyses is not previous.analyses:
+        changed, removed = diff_analyses(previous.analyses, snapshot.analyses)
+        event_broker.publish('analyses', {'changed': changed, 'removed': removed})
+    event_broker.publish('status', status_payload(snapshot))
+
+monitor.add_listener(publish_changes)
+monitor.ensure_supervisor()
+
+# Edits to .env, from the settings page or by hand, apply without a restart
+config_service = ConfigService()
+config_service.subscribe(monitor.apply_config)
+config_service.start_watching()
+
+def snapshot_is_fresh():
+    max_age = getattr(Config, 'SNAPSHOT_MAX_AGE_MINUTES', Config.CHECK_INTERVAL)
+    return monitor.is_fresh(max_age * 60)
+
+def run_test_check():
+    if snapshot_is_fresh():
+        analyses = monitor.snapshot.analyses
+        source = 'latest monitor snapshot'
+    else:
+        analyses = monitor.request_check()
+        if not monitor.snapshot.active:
+            # Nobody else is draining the outbox
+            monitor.get_system().sender.drain_once()
+        source = 'new market check'
+    
+    return {
+        'message': f'Test completed. Found {len(analyses)} stocks ({source}).',
+        'data': analyses
+    }
+
+def parse_time(value):
+    # Epoch seconds or an ISO date/datetime
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def run_daily_summary():
+    monitor.send_summary()
+    return {'message': 'Daily summary sent'}
 
 @app.route('/')
 def index():
+    snapshot = monitor.snapshot
     return render_template('index.html', 
-                         monitoring_active=monitoring_active,
-                         last_check_time=last_check_time,
-                         analyses=last_analyses)
+                         monitoring_active=snapshot.active,
+                         last_check_time=snapshot.last_check_time,
+                         analyses=snapshot.analyses)
 
 @app.route('/settings', methods=['GET', 'POST'])
 def settings():
     if request.method == 'POST':
-        # Update .env file with new settings
-        env_content = []
-        
-        # Read current .env file
-        env_path = '.env'
-        if os.path.exists(env_path):
-            with open(env_path, 'r') as f:
-                env_content = f.readlines()
-        
-        # Update values
         settings_map = {
             'EMAIL_ADDRESS': request.form.get('email_address', ''),
             'EMAIL_PASSWORD': request.form.get('email_password', ''),
@@ -54,25 +110,14 @@ def settings():
             'SMTP_PORT': request.form.get('smtp_port', '587')
         }
         
-        # Create new env content
-        new_env_content = []
-        new_env_content.append("# Email Configuration\n")
-        new_env_content.append(f"SMTP_SERVER={settings_map['SMTP_SERVER']}\n")
-        new_env_content.append(f"SMTP_PORT={settings_map['SMTP_PORT']}\n")
-        new_env_content.append(f"EMAIL_ADDRESS={settings_map['EMAIL_ADDRESS']}\n")
-        new_env_content.append(f"EMAIL_PASSWORD={settings_map['EMAIL_PASSWORD']}\n")
-        new_env_content.append(f"RECIPIENT_EMAIL={settings_map['RECIPIENT_EMAIL']}\n")
-        new_env_content.append("\n# Alert Thresholds (percentages)\n")
-        new_env_content.append(f"BUY_ALERT_THRESHOLD={settings_map['BUY_ALERT_THRESHOLD']}\n")
-        new_env_content.append(f"SELL_ALERT_THRESHOLD={settings_map['SELL_ALERT_THRESHOLD']}\n")
-        new_env_content.append("\n# Check Interval (minutes)\n")
-        new_env_content.append(f"CHECK_INTERVAL={settings_map['CHECK_INTERVAL']}\n")
+        # Merged into .env, so keys this form doesn't show (API key, symbols) survive
+        try:
+            config_service.update(settings_map)
+        except ValueError as e:
+            flash(f'Settings not saved: {e}', 'danger')
+            return redirect(url_for('settings'))
         
-        # Write to .env file
-        with open(env_path, 'w') as f:
-            f.writelines(new_env_content)
-        
-        flash('Settings saved successfully!', 'success')
+        flash('Settings saved and applied!', 'success')
         return redirect(url_for('settings'))
     
     # GET request - show current settings
@@ -91,75 +136,100 @@ def settings():
 
 @app.route('/api/start_monitoring', methods=['POST'])
 def start_monitoring():
-    global monitoring_thread, monitoring_active, alert_system
-    
-    if monitoring_active:
+    if monitor.snapshot.active:
         return jsonify({'status': 'error', 'message': 'Monitoring is already active'})
     
     try:
-        # Reload config after settings change
-        os.system('python -c "from dotenv import load_dotenv; load_dotenv(override=True)"')
-        
-        alert_system = StockAlertSystem()
-        monitoring_active = True
-        
-        def monitor_loop():
-            global last_check_time, last_analyses, monitoring_active
-            while monitoring_active:
-                try:
-                    last_analyses = alert_system.run_once()
-                    last_check_time = datetime.now()
-                    time.sleep(int(os.getenv('CHECK_INTERVAL', 60)) * 60)
-                except Exception as e:
-                    print(f"Error in monitoring loop: {e}")
-                    time.sleep(60)
-        
-        monitoring_thread = threading.Thread(target=monitor_loop)
-        monitoring_thread.daemon = True
-        monitoring_thread.start()
+        # Pick up any .env edits the watcher hasn't seen yet
+        config_service.reload()
         
+        monitor.start()
         return jsonify({'status': 'success', 'message': 'Monitoring started'})
     except Exception as e:
-        monitoring_active = False
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/reload_config', methods=['POST'])
+def reload_config():
+    try:
+        changes = config_service.reload()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'message': 'Configuration reloaded', 'changed': sorted(changes)})
+
 @app.route('/api/stop_monitoring', methods=['POST'])
 def stop_monitoring():
-    global monitoring_active
-    
-    monitoring_active = False
+    monitor.stop()
     return jsonify({'status': 'success', 'message': 'Monitoring stopped'})
 
 @app.route('/api/test_alert', methods=['POST'])
 def test_alert():
-    try:
-        alert_system = StockAlertSystem()
-        analyses = alert_system.run_once()
-        
-        return jsonify({
-            'status': 'success', 
-            'message': f'Test completed. Found {len(analyses)} stocks.',
-            'data': analyses
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+    job_id = job_manager.submit('test_alert', run_test_check)
+    return jsonify({'status': 'success', 'message': 'Test started', 'job_id': job_id}), 202
 
 @app.route('/api/send_summary', methods=['POST'])
 def send_summary():
+    job_id = job_manager.submit('send_summary', run_daily_summary)
+    return jsonify({'status': 'success', 'message': 'Daily summary queued', 'job_id': job_id}), 202
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    return jsonify({'status': 'success', 'job': job})
+
+@app.route('/api/stream')
+def stream():
+    subscriber = event_broker.subscribe()
+    
+    def events():
+        try:
+            # A (re)connecting client first gets the full state, then only diffs
+            yield format_sse('status', status_payload())
+            yield format_sse('analyses', {'changed': monitor.snapshot.analyses, 'removed': [], 'snapshot': True})
+            while event_broker.is_subscribed(subscriber):
+                try:
+                    yield subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            event_broker.unsubscribe(subscriber)
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/history/<symbol>')
+def get_history(symbol):
+    # ?start=&end= (epoch seconds or ISO dates), points= (default 500), method=lttb|minmax
     try:
-        alert_system = StockAlertSystem()
-        alert_system.send_daily_summary()
-        return jsonify({'status': 'success', 'message': 'Daily summary sent'})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+        start = parse_time(request.args.get('start'))
+        end = parse_time(request.args.get('end'))
+        points = int(request.args.get('points', 500))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if not MIN_POINTS <= points <= MAX_POINTS:
+        return jsonify({'status': 'error', 'message': f'points must be between {MIN_POINTS} and {MAX_POINTS}'}), 400
+    method = request.args.get('method', 'lttb')
+    if method not in ('lttb', 'minmax'):
+        return jsonify({'status': 'error', 'message': 'method must be lttb or minmax'}), 400
+    
+    history = history_store.query(symbol.upper(), start, end, points=points, method=method)
+    return jsonify({'status': 'success', 'symbol': symbol.upper(), 'method': method, **history})
+
+@app.route('/metrics')
+def metrics():
+    # Per process: with several workers, scrape each one (checks only run in the leader)
+    return Response(REGISTRY.render(), mimetype=CONTENT_TYPE.split(';')[0], headers={'Content-Type': CONTENT_TYPE})
 
 @app.route('/api/status')
 def get_status():
+    snapshot = monitor.snapshot
     return jsonify({
-        'monitoring_active': monitoring_active,
-        'last_check_time': last_check_time.isoformat() if last_check_time else None,
-        'analyses_count': len(last_analyses),
-        'symbols': list(Config.SYMBOLS.keys())
+        **status_payload(snapshot),
+        'analyses_count': len(snapshot.analyses),
+        'symbols': list((monitor.system.symbols if monitor.system else Config.SYMBOLS).keys())
     })
 
 if __name__ == '__main__':